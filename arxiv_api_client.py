@@ -1,14 +1,80 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
+import io
+import re
+import sys
+import threading
+from typing import Optional, Iterator, BinaryIO
+import time
 import xml.etree.ElementTree as ET
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote
+from instrumentation import timed_stage, timed_iter
 
 
 API_URL = 'http://export.arxiv.org/api/query'
 NAMESPACE = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH_NAMESPACE = "{http://a9.com/-/spec/opensearch/1.1/}"
+ENTRY_TAG = f"{NAMESPACE}entry"
+AUTHOR_TAG = f"{NAMESPACE}author"
+NAME_TAG = f"{NAMESPACE}name"
+ID_TAG = f"{NAMESPACE}id"
+UPDATED_TAG = f"{NAMESPACE}updated"
+PUBLISHED_TAG = f"{NAMESPACE}published"
+TITLE_TAG = f"{NAMESPACE}title"
+SUMMARY_TAG = f"{NAMESPACE}summary"
+LINK_TAG = f"{NAMESPACE}link"
+TOTAL_RESULTS_TAG = f"{OPENSEARCH_NAMESPACE}totalResults"
+# Matches both new (2510.14837v1) and old-style (hep-th/9901001v1) ids, optionally prefixed by the abstract URL
+ARXIV_ID_PATTERN = re.compile(r"(?:arxiv\.org/abs/)?((?:[a-zA-Z.-]+/)?\d{4}\.?\d{3,5})(v\d+)?$")
 
-@dataclass
+REQUEST_INTERVAL = 3.5 # ArXiv API has a 1 request per 3 seconds rate limit
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF = 5.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Callers only wait when the bucket is empty, so the first request (or one made after a long enough pause) goes out immediately.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        :param rate: Number of tokens added per second.
+        :param capacity: Maximum number of tokens stored in the bucket (maximum burst size).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self)->None:
+        """
+        Take a token from the bucket, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+# Shared by all callers in the process, so that the arXiv rate limit holds no matter where the requests come from
+rate_limiter = TokenBucket(rate=1 / REQUEST_INTERVAL)
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+@dataclass(slots=True)
 class Paper:
     id: str
     updated: datetime
@@ -19,6 +85,25 @@ class Paper:
     paper_link: str
     paper_pdf_link: str
 
+@dataclass(slots=True)
+class FeedInfo:
+    total_results: int = 0
+
+def paper_to_str(paper: Paper) -> str:
+    """
+    Format the paper information as text (for LLM prompts and tool outputs)
+    :param paper: Paper to format
+    :return: Text representation of the paper
+    """
+    return (
+        f"id: {paper.id} \n"
+        f"Title: {paper.title} \n"
+        f"Authors: {paper.authors} \n"
+        f"Published: {paper.published} \n"
+        f"Summary {paper.summary} \n"
+        f"PDF link: {paper.paper_pdf_link} \n"
+    )
+
 def clean_string(string: str) -> str:
     """
     Remove newlines and double spaces from the string
@@ -27,6 +112,18 @@ def clean_string(string: str) -> str:
     """
     return string.replace("\n", "").replace("  ", " ")
 
+def split_arxiv_id(paper_id: str) -> tuple[str, str]:
+    """
+    Split the id of a paper (as returned by the API, e.g. http://arxiv.org/abs/2510.14837v1) into the arXiv id and version
+    :param paper_id: Id (or abstract URL) of the paper
+    :return: Tuple of the arXiv id without the version (e.g. 2510.14837) and the version (e.g. v1, empty if not present)
+    """
+    paper_id = paper_id.strip()
+    match = ARXIV_ID_PATTERN.search(paper_id)
+    if match is None:
+        return paper_id, ""
+    return match.group(1), match.group(2) or ""
+
 def datetime_to_arxiv_str(datetime_obj: datetime) -> str:
     """
     Converts a datetime object to a string in the format expected by the ArXiv API
@@ -35,14 +132,17 @@ def datetime_to_arxiv_str(datetime_obj: datetime) -> str:
     """
     return datetime_obj.strftime("%Y%m%d%H%M")
 
-def get_papers(search_query: str, max_results: int = 20, start: int = 0, last_month: bool = True) -> list[Paper]:
+def get_query_url(search_query: str, max_results: int = 20, start: int = 0, last_month: bool = True,
+                  sort_by: Optional[str] = None, sort_order: str = "descending") -> str:
     """
-    Retrieve papers from arXiv API
+    Build the arXiv API query URL
     :param search_query: Text to search for
     :param max_results: Maximum number of papers to return
     :param start: Index of first paper to return (for batching results)
     :param last_month: If true, return only papers published during the last month
-    :return: List of Paper objects
+    :param sort_by: Sort order of the results ("relevance", "lastUpdatedDate" or "submittedDate"), API default if None
+    :param sort_order: "ascending" or "descending" (only used if sort_by is given)
+    :return: Full query URL
     """
 
     params = {
@@ -62,8 +162,69 @@ def get_papers(search_query: str, max_results: int = 20, start: int = 0, last_mo
         params["search_query"] = quote(search_query, safe=':+[]')
 
     url = f"{API_URL}?search_query={params['search_query']}&start={params['start']}&max_results={params['max_results']}"
-    response = requests.get(url)
-    return parse_atom_response(response.text)
+    if sort_by is not None:
+        url += f"&sortBy={sort_by}&sortOrder={sort_order}"
+    return url
+
+def get_papers(search_query: str, max_results: int = 20, start: int = 0, last_month: bool = True,
+               sort_by: Optional[str] = None, sort_order: str = "descending") -> list[Paper]:
+    """
+    Retrieve papers from arXiv API
+    :param search_query: Text to search for
+    :param max_results: Maximum number of papers to return
+    :param start: Index of first paper to return (for batching results)
+    :param last_month: If true, return only papers published during the last month
+    :param sort_by: Sort order of the results ("relevance", "lastUpdatedDate" or "submittedDate"), API default if None
+    :param sort_order: "ascending" or "descending" (only used if sort_by is given)
+    :return: List of Paper objects
+    """
+    return list(iter_papers(search_query, max_results, start, last_month, sort_by, sort_order))
+
+def iter_papers(search_query: str, max_results: int = 20, start: int = 0, last_month: bool = True,
+                sort_by: Optional[str] = None, sort_order: str = "descending") -> Iterator[Paper]:
+    """
+    Retrieve papers from arXiv API, yielding each paper as soon as its entry is downloaded and parsed.
+    Requests respect the rate limit. Requests that fail with HTTP 503, or return an empty feed even though
+    the query has results past the start index (which the arXiv API occasionally does), are retried with exponential backoff.
+    :param search_query: Text to search for
+    :param max_results: Maximum number of papers to return
+    :param start: Index of first paper to return (for batching results)
+    :param last_month: If true, return only papers published during the last month
+    :param sort_by: Sort order of the results ("relevance", "lastUpdatedDate" or "submittedDate"), API default if None
+    :param sort_order: "ascending" or "descending" (only used if sort_by is given)
+    :return: Iterator over Paper objects
+    """
+    url = get_query_url(search_query, max_results, start, last_month, sort_by, sort_order)
+    for attempt in range(MAX_RETRIES + 1):
+        with timed_stage("arxiv wait"):
+            rate_limiter.acquire()
+        with timed_stage("arxiv request"):
+            response = session.get(url, timeout=REQUEST_TIMEOUT, stream=True)
+        with response:
+            if response.status_code == 503 and attempt < MAX_RETRIES:
+                wait_before_retry(response, attempt)
+                continue
+            response.raise_for_status()
+            response.raw.decode_content = True
+            feed_info = FeedInfo()
+            no_papers = 0
+            # Download and parsing are interleaved, as the feed is parsed while it streams in
+            for paper in timed_iter("arxiv download + parse", iter_parse_feed(response.raw, feed_info), response.raw.tell):
+                no_papers += 1
+                yield paper
+            if no_papers > 0 or not feed_info.total_results > start or attempt == MAX_RETRIES:
+                return
+            wait_before_retry(response, attempt)
+
+def wait_before_retry(response: requests.Response, attempt: int)->None:
+    """
+    Sleep before retrying a request, for the time requested by the server or with exponential backoff.
+    :param response: Response to the failed request
+    :param attempt: Index of the failed attempt (0-based)
+    """
+    retry_after = response.headers.get("Retry-After", "")
+    with timed_stage("arxiv wait"):
+        time.sleep(float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * 2 ** attempt)
 
 def parse_atom_response(response: str)-> list[Paper]:
     """
@@ -71,49 +232,72 @@ def parse_atom_response(response: str)-> list[Paper]:
     :param response: String response from arXiv API in the Atom XML format
     :return: List of Paper objects
     """
-    root = ET.fromstring(response)
-    papers = []
-    for child in root:
-        if child.tag == f'{NAMESPACE}entry':
-            paper_id = None
-            updated = None
-            published = None
-            title = None
-            summary = None
-            authors = []
-            paper_link = None
-            paper_pdf_link = None
-
-            for element in child:
-                if element.tag == f"{NAMESPACE}author":
-                    authors.append(element.find(f"{NAMESPACE}name").text)
-                if element.tag == f"{NAMESPACE}id":
-                    paper_id = element.text
-                if element.tag == f"{NAMESPACE}updated":
-                    updated = datetime.fromisoformat(element.text)
-                if element.tag == f"{NAMESPACE}published":
-                    published = datetime.fromisoformat(element.text)
-                if element.tag == f"{NAMESPACE}title":
-                    title = clean_string(element.text)
-                if element.tag == f"{NAMESPACE}summary":
-                    summary = clean_string(element.text)
-                if element.tag == f"{NAMESPACE}link":
-                    target = element.attrib['href']
-                    if "pdf" in target:
-                        paper_pdf_link = target
-                    else:
-                        paper_link = target
-
-            paper = Paper(
-                id=paper_id,
-                updated=updated,
-                published=published,
-                title=title,
-                summary=summary,
-                authors=authors,
-                paper_link=paper_link,
-                paper_pdf_link=paper_pdf_link,
-            )
-            papers.append(paper)
-
-    return papers
+    return list(iter_parse_feed(io.BytesIO(response.encode("utf-8"))))
+
+def iter_parse_feed(source: BinaryIO, feed_info: Optional[FeedInfo] = None)-> Iterator[Paper]:
+    """
+    Incrementally parse an Atom feed returned by the arXiv API.
+    Each entry is converted to a Paper as soon as it is fully read, and discarded afterward,
+    so only a single entry is kept in memory at a time.
+    :param source: Binary file-like object with the feed in the Atom XML format
+    :param feed_info: If given, filled with information about the feed (e.g. the total number of results)
+    :return: Iterator over Paper objects
+    """
+    root = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = element
+        elif event == "end":
+            if element.tag == ENTRY_TAG:
+                yield parse_entry(element)
+                root.clear()
+            elif element.tag == TOTAL_RESULTS_TAG and feed_info is not None:
+                feed_info.total_results = int(element.text)
+
+def parse_entry(entry: ET.Element)-> Paper:
+    """
+    Convert an entry of the Atom feed to a Paper
+    :param entry: The <entry> element
+    :return: Paper object
+    """
+    paper_id = None
+    updated = None
+    published = None
+    title = None
+    summary = None
+    authors = []
+    paper_link = None
+    paper_pdf_link = None
+
+    for element in entry:
+        tag = element.tag
+        if tag == AUTHOR_TAG:
+            # Names of prolific authors repeat across many papers, so a single copy of each is kept
+            authors.append(sys.intern(element.find(NAME_TAG).text))
+        elif tag == ID_TAG:
+            paper_id = element.text
+        elif tag == UPDATED_TAG:
+            updated = datetime.fromisoformat(element.text)
+        elif tag == PUBLISHED_TAG:
+            published = datetime.fromisoformat(element.text)
+        elif tag == TITLE_TAG:
+            title = clean_string(element.text)
+        elif tag == SUMMARY_TAG:
+            summary = clean_string(element.text)
+        elif tag == LINK_TAG:
+            target = element.attrib['href']
+            if "pdf" in target:
+                paper_pdf_link = target
+            else:
+                paper_link = target
+
+    return Paper(
+        id=paper_id,
+        updated=updated,
+        published=published,
+        title=title,
+        summary=summary,
+        authors=authors,
+        paper_link=paper_link,
+        paper_pdf_link=paper_pdf_link,
+    )
\ No newline at end of file
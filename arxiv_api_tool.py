@@ -1,20 +1,157 @@
-from langchain.tools import tool
-from arxiv_api_client import get_papers, Paper
+import asyncio
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Callable, Hashable
 
-def paper_to_str(paper: Paper) -> str:
-    return (
-        f"id: {paper.id} \n"
-        f"Title: {paper.title} \n"
-        f"Authors: {paper.authors} \n"
-        f"Published: {paper.published} \n"
-        f"Summary {paper.summary} \n"
-        f"PDF link: {paper.paper_pdf_link} \n"
-    )
+from langchain_core.tools import StructuredTool
+from arxiv_api_client import get_papers, paper_to_str
+from parse_config import get_tool_cache_ttl_minutes, get_tool_cache_max_entries
 
 
-@tool
-def get_arxiv_papers(query: str, max_results: int = 10, start: int = 0, last_month: bool = True)->str:
+class QueryResultCache:
+    """
+    In-memory LRU cache of tool results with a time to live, shared by the sync and async versions of the tool.
+    Concurrent requests for the same key are merged - only the first one fetches the result, and the others wait for it.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        :param max_entries: Maximum number of cached results (least recently used ones are evicted first).
+        :param ttl_seconds: Time after which cached results expire.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Key -> (expiration time, result), least recently used first
+        self._entries: OrderedDict[Hashable, tuple[float, str]] = OrderedDict()
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_future(self, key: Hashable)->tuple[Future, bool]:
+        """
+        Get a future of the result for the key: completed if it's cached, or the one of a fetch already in progress.
+        :param key: Cache key.
+        :return: The future, and True if the caller has to fetch the result (and complete the future) itself.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    future = Future()
+                    future.set_result(entry[1])
+                    return future, False
+                del self._entries[key]
+            if key in self._in_flight:
+                return self._in_flight[key], False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _fetch(self, key: Hashable, future: Future, fetch: Callable[[], str])->None:
+        """
+        Fetch the result for the key, cache it and complete the future (failures are passed on, but not cached).
+        :param key: Cache key.
+        :param future: Future to complete.
+        :param fetch: Function fetching the result.
+        """
+        try:
+            result = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(result)
+
+    def get(self, key: Hashable, fetch: Callable[[], str])->str:
+        """
+        Get the result for the key, fetching it if it isn't cached.
+        :param key: Cache key.
+        :param fetch: Function fetching the result.
+        :return: The result.
+        """
+        future, is_owner = self._get_future(key)
+        if is_owner:
+            self._fetch(key, future, fetch)
+        return future.result()
+
+    async def aget(self, key: Hashable, fetch: Callable[[], str])->str:
+        """
+        Get the result for the key, fetching it in a worker thread (so the event loop isn't blocked) if it isn't cached.
+        :param key: Cache key.
+        :param fetch: Function fetching the result.
+        :return: The result.
+        """
+        future, is_owner = self._get_future(key)
+        if is_owner:
+            await asyncio.to_thread(self._fetch, key, future, fetch)
+        return await asyncio.wrap_future(future)
+
+    def clear(self)->None:
+        """
+        Remove all cached results.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache()->QueryResultCache:
+    """
+    Get the process-wide cache of tool results, configured with `tool_cache_*` in the ini file.
+    :return: The cache.
+    """
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryResultCache(get_tool_cache_max_entries(), get_tool_cache_ttl_minutes() * 60)
+    return _query_cache
+
+def normalize_query(query: str)->str:
+    """
+    Normalize the query, so that queries differing only in letter case or whitespace share cached results.
+    :param query: Query text.
+    :return: Normalized query.
+    """
+    return " ".join(query.lower().split())
+
+def get_query_key(query: str, max_results: int, start: int, last_month: bool)->tuple:
+    """
+    Get the cache key of a tool call.
+    The date window of "last month" queries moves with time, so they're keyed by the current (UTC) day.
+    :param query: Query text.
+    :param max_results: Maximum number of papers to return.
+    :param start: Start index for pagination.
+    :param last_month: Whether to only return papers published in the last month.
+    :return: Cache key.
+    """
+    date_window = datetime.now(timezone.utc).date().isoformat() if last_month else None
+    return normalize_query(query), start, max_results, date_window
+
+def _get_papers_str(query: str, max_results: int, start: int, last_month: bool)->str:
+    """
+    Retrieve papers from the arXiv API and format them for the model.
+    :param query: String to search for
+    :param max_results: Maximum number of papers to return.
+    :param start: Start index for pagination.
+    :param last_month: Whether to only return papers published in the last month.
+    :return: A string representation of the retrieved papers
+    """
+    papers = get_papers(query, max_results=max_results, start=start, last_month=last_month)
+    papers_str = [paper_to_str(x) for x in papers]
+    return "\n --- \n".join(papers_str)
+
+def fetch_arxiv_papers(query: str, max_results: int = 10, start: int = 0, last_month: bool = True)->str:
     """
     Retrieve paper information using arXiv API.
     :param query: String to search for
@@ -24,9 +161,20 @@ def get_arxiv_papers(query: str, max_results: int = 10, start: int = 0, last_mon
     :return: A string representation of the retrieved papers
     """
     print(f"Model called get_arxiv_papers with args: query={query}, max_results={max_results}, start={start}, last_month={last_month}")
-    time.sleep(3.5) # No more than 1 request every 3 seconds
-    if max_results > 500:
-        max_results = 500
-    papers = get_papers(query, max_results=max_results, start=start, last_month=last_month)
-    papers_str = [paper_to_str(x) for x in papers]
-    return "\n --- \n".join(papers_str)
\ No newline at end of file
+    max_results = min(max_results, 500)
+    return get_query_cache().get(get_query_key(query, max_results, start, last_month),
+                                 lambda: _get_papers_str(query, max_results, start, last_month))
+
+async def afetch_arxiv_papers(query: str, max_results: int = 10, start: int = 0, last_month: bool = True)->str:
+    """
+    Async version of fetch_arxiv_papers. The request runs in a worker thread, and identical concurrent calls
+    (e.g. parallel tool calls of an agent) are merged into a single request.
+    """
+    print(f"Model called get_arxiv_papers with args: query={query}, max_results={max_results}, start={start}, last_month={last_month}")
+    max_results = min(max_results, 500)
+    return await get_query_cache().aget(get_query_key(query, max_results, start, last_month),
+                                        lambda: _get_papers_str(query, max_results, start, last_month))
+
+# Single tool usable by both sync (invoke) and async (ainvoke) agents, described to the model by fetch_arxiv_papers' docstring
+get_arxiv_papers = StructuredTool.from_function(func=fetch_arxiv_papers, coroutine=afetch_arxiv_papers,
+                                                name="get_arxiv_papers")
\ No newline at end of file
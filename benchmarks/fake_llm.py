@@ -0,0 +1,85 @@
+"""
+Deterministic stand-in for the Gemini LLM, used to benchmark the pipelines without network access or an API key.
+"""
+import re
+import time
+import zlib
+from typing import Any, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from llm_usage import UsageCallbackHandler
+from model import estimate_tokens
+from paper_filtering import PaperRatings, PaperRating
+from text_cleaning import CleanedDocument, CleanedParagraph
+
+PAPER_ID_PATTERN = re.compile(r"^\s*id: (\S+)", re.MULTILINE)
+# Words of the prompt repeated in plain text answers (about the length of the requested summaries)
+ANSWER_WORDS = 400
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering every prompt after a fixed latency, with a response derived from the prompt.
+    Structured outputs (paper ratings, cleaned documents) are filled in from the prompt, so the pipelines run as usual.
+    """
+    latency: float = 0.2
+    seconds_per_output_token: float = 0.0
+
+    @property
+    def _llm_type(self)->str:
+        return "benchmark-fake"
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager: Any = None,
+                  response_schema: Optional[type[BaseModel]] = None, **kwargs: Any)->ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if response_schema is PaperRatings:
+            content = rate_papers(prompt).model_dump_json()
+        elif response_schema is CleanedDocument:
+            content = clean_document(prompt).model_dump_json()
+        else:
+            content = " ".join(prompt.split()[-ANSWER_WORDS:])
+        output_tokens = estimate_tokens(content)
+        time.sleep(self.latency + output_tokens * self.seconds_per_output_token)
+        usage = {"input_tokens": estimate_tokens(prompt), "output_tokens": output_tokens,
+                 "total_tokens": estimate_tokens(prompt) + output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content, usage_metadata=usage))])
+
+    def with_structured_output(self, schema: type[BaseModel], **kwargs: Any):
+        return self.bind(response_schema=schema) | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+def rate_papers(prompt: str)->PaperRatings:
+    """
+    Rate every paper in the prompt, with scores derived from its id.
+    :param prompt: Rating prompt.
+    :return: Ratings of the papers.
+    """
+    ratings = []
+    for paper_id in PAPER_ID_PATTERN.findall(prompt):
+        checksum = zlib.crc32(paper_id.encode("utf-8"))
+        ratings.append(PaperRating(paper_id=paper_id, title="", novelty=checksum % 5 + 1, clarity=checksum // 5 % 5 + 1,
+                                   impact=checksum // 25 % 5 + 1, comment="Benchmark rating."))
+    return PaperRatings(paper_ratings=ratings)
+
+def clean_document(prompt: str)->CleanedDocument:
+    """
+    Return the paragraphs of the article in the cleanup prompt as they are.
+    :param prompt: Cleanup prompt.
+    :return: The "cleaned" document.
+    """
+    paragraphs = [x.strip() for x in prompt.split("\n\n")[1:] if x.strip()]
+    return CleanedDocument(cleaned_paragraphs=[CleanedParagraph(cleaned_text=x) for x in paragraphs])
+
+def make_fake_llm_factory(latency: float, seconds_per_output_token: float = 0.0):
+    """
+    Create a factory of fake LLMs for model.set_llm_factory.
+    :param latency: Time (in seconds) every call takes.
+    :param seconds_per_output_token: Additional time per output token.
+    :return: Function creating a FakeChatModel.
+    """
+    return lambda: FakeChatModel(latency=latency, seconds_per_output_token=seconds_per_output_token,
+                                 callbacks=[UsageCallbackHandler()])
\ No newline at end of file
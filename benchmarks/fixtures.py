@@ -0,0 +1,201 @@
+"""
+Inputs for the offline benchmarks: arXiv Atom feeds and multi-page PDFs.
+Feeds recorded from the arXiv API (see --record) are used when present in benchmarks/fixtures,
+otherwise deterministic synthetic feeds of the same size are generated.
+
+Usage (from the repository root, next to config.ini):
+    python benchmarks/fixtures.py --record    # download the feeds used by the benchmarks
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timezone, timedelta
+from xml.sax.saxutils import escape
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from text_quality import COMMON_WORDS
+
+# Numbers of entries of the benchmarked feeds
+FEED_SIZES = (10, 100, 1000)
+RECORD_QUERY = "cat:cs.LG"
+
+TOPIC_WORDS = ("transformer", "attention", "gradient", "optimization", "convergence", "benchmark", "dataset",
+               "embedding", "inference", "latency", "sparse", "quantization", "retrieval", "reinforcement",
+               "policy", "reward", "diffusion", "sampling", "robust", "adversarial", "federated", "graph",
+               "kernel", "regularization", "generalization", "evaluation", "architecture", "pretraining")
+VOCABULARY = tuple(sorted(COMMON_WORDS)) + TOPIC_WORDS
+
+FEED_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+               'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+               '<title type="html">ArXiv Query: benchmark</title>\n'
+               '<opensearch:totalResults>{total_results}</opensearch:totalResults>\n'
+               '<opensearch:startIndex>{start}</opensearch:startIndex>\n'
+               '<opensearch:itemsPerPage>{items_per_page}</opensearch:itemsPerPage>\n')
+
+ENTRY_TEMPLATE = """<entry>
+<id>http://arxiv.org/abs/{paper_id}v1</id>
+<updated>{updated}</updated>
+<published>{published}</published>
+<title>{title}</title>
+<summary>{summary}</summary>
+{authors}
+<link href="http://arxiv.org/abs/{paper_id}v1" rel="alternate" type="text/html"/>
+<link title="pdf" href="http://arxiv.org/pdf/{paper_id}v1" rel="related" type="application/pdf"/>
+<arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+</entry>
+"""
+
+def make_words(rng: random.Random, count: int)->str:
+    """
+    Generate English-looking text (about half common words, like real text).
+    :param rng: Random number generator.
+    :param count: Number of words.
+    :return: Words separated with spaces.
+    """
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+def make_atom_entries(count: int, seed: int = 0, start: int = 0)->list[str]:
+    """
+    Generate entries of an arXiv Atom feed, most recently updated first.
+    :param count: Number of entries.
+    :param seed: Seed of the generated content (e.g. different for each query).
+    :param start: Index of the first entry in the full results.
+    :return: XML of the entries.
+    """
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    entries = []
+    for index in range(start, start + count):
+        rng = random.Random(seed * 1000003 + index)
+        timestamp = (now - timedelta(hours=index)).isoformat().replace("+00:00", "Z")
+        authors = "\n".join(f"<author><name>Author {rng.randrange(500)} {rng.choice(TOPIC_WORDS).title()}</name></author>"
+                            for _ in range(rng.randint(1, 6)))
+        entries.append(ENTRY_TEMPLATE.format(paper_id=f"{2600 + seed % 100}.{index:05d}", updated=timestamp,
+                                             published=timestamp, title=escape(make_words(rng, 10).capitalize()),
+                                             summary=escape(make_words(rng, 150)), authors=authors))
+    return entries
+
+def make_atom_feed(count: int, seed: int = 0, start: int = 0, total_results: int = None)->str:
+    """
+    Generate an arXiv Atom feed (as returned by the API).
+    :param count: Number of entries.
+    :param seed: Seed of the generated content.
+    :param start: Index of the first entry in the full results.
+    :param total_results: Total number of results of the query (defaults to start + count).
+    :return: The feed in the Atom XML format.
+    """
+    if total_results is None:
+        total_results = start + count
+    header = FEED_HEADER.format(total_results=total_results, start=start, items_per_page=count)
+    return header + "".join(make_atom_entries(count, seed, start)) + "</feed>\n"
+
+def get_feed_fixture_path(size: int)->str:
+    """
+    Get the path of the recorded feed with the given number of entries.
+    :param size: Number of entries.
+    :return: Path of the fixture file.
+    """
+    return os.path.join(FIXTURES_DIR, f"atom_{size}.xml")
+
+def load_atom_feed(size: int)->tuple[str, str]:
+    """
+    Load the recorded feed with the given number of entries, or generate a synthetic one if it wasn't recorded.
+    :param size: Number of entries.
+    :return: The feed in the Atom XML format, and its origin ("recorded" or "synthetic").
+    """
+    path = get_feed_fixture_path(size)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read(), "recorded"
+    return make_atom_feed(size), "synthetic"
+
+def record_atom_feeds(sizes: tuple[int, ...] = FEED_SIZES, query: str = RECORD_QUERY)->None:
+    """
+    Download feeds with the given numbers of entries from the arXiv API and save them as fixtures.
+    :param sizes: Numbers of entries.
+    :param query: Query of the feeds.
+    """
+    from arxiv_api_client import get_query_url, rate_limiter, session, REQUEST_TIMEOUT
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for size in sizes:
+        rate_limiter.acquire()
+        response = session.get(get_query_url(query, size, last_month=False), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        with open(get_feed_fixture_path(size), "w", encoding="utf-8") as f:
+            f.write(response.text)
+        print(f"Recorded {get_feed_fixture_path(size)} ({len(response.content)} bytes)")
+
+def _escape_pdf_string(text: str)->str:
+    """
+    Escape text for use in a PDF string literal.
+    :param text: Text (ASCII).
+    :return: Escaped text.
+    """
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: list[list[str]])->bytes:
+    """
+    Write a minimal PDF with the given lines of text on each page (Helvetica, US Letter pages).
+    :param pages: Lines of text of each page.
+    :return: Contents of the PDF file.
+    """
+    # Objects 1-3 are the catalog, the page tree and the font, followed by a (contents, page) pair for each page
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for lines in pages:
+        text = " T*\n".join(f"({_escape_pdf_string(line)}) Tj" for line in lines)
+        stream = f"BT\n/F1 10 Tf\n12 TL\n54 740 Td\n{text}\nET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{obj}\nendobj\n".encode("ascii")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("ascii")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+    return bytes(output)
+
+def make_article_pdf(path: str, page_count: int, garbled_every: int = 4, seed: int = 0)->None:
+    """
+    Write a PDF resembling an extracted article: pages of text, some of them garbled (missing spaces),
+    as text extraction sometimes produces, so that they need cleanup.
+    :param path: Path of the PDF file to write.
+    :param page_count: Number of pages.
+    :param garbled_every: Every n-th page is garbled (0 for none).
+    :param seed: Seed of the generated text.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(page_count):
+        lines = [make_words(rng, 14) for _ in range(55)]
+        if garbled_every and page_number % garbled_every == garbled_every - 1:
+            lines = ["".join(line.split()) for line in lines]
+        pages.append(lines)
+    with open(path, "wb") as f:
+        f.write(make_pdf(pages))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="Download the benchmarked feeds from the arXiv API.")
+    parser.add_argument("--query", default=RECORD_QUERY, help="Query of the recorded feeds.")
+    args = parser.parse_args()
+    if args.record:
+        record_atom_feeds(query=args.query)
+    else:
+        parser.print_help()
\ No newline at end of file
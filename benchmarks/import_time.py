@@ -0,0 +1,45 @@
+"""
+Measure how long it takes to import the entry point modules of the project.
+Every import is timed in a fresh interpreter, so nothing is shared between measurements.
+
+Usage (from the repository root, next to config.ini):
+    python benchmarks/import_time.py [--repeat N] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ("parse_config", "arxiv_api_client", "arxiv_api_tool", "paper_filtering",
+                   "pdf_text_extraction", "pdf_summarization", "research_digest")
+
+TIMING_SNIPPET = ("import time; start = time.perf_counter(); import {module}; "
+                  "print(time.perf_counter() - start)")
+
+def time_import(module: str)->float:
+    """
+    Import the module in a new interpreter and measure the time the import took.
+    :param module: Name of the module to import.
+    :return: Import time in seconds.
+    """
+    result = subprocess.run([sys.executable, "-c", TIMING_SNIPPET.format(module=module)],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main()->None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of imports of each module.")
+    args = parser.parse_args()
+
+    print(f"{'module':<24}{'median [ms]':>12}{'min [ms]':>12}")
+    for module in args.modules:
+        times = [time_import(module) for _ in range(args.repeat)]
+        print(f"{module:<24}{statistics.median(times) * 1000:>12.1f}{min(times) * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+Offline benchmarks of the hot paths of the pipelines: parsing arXiv feeds, extracting text from PDFs,
+rating papers and generating a report end to end.
+arXiv responses are served from fixtures and the LLM is replaced by a deterministic stand-in with a configurable latency,
+so no network access or API key is needed. Everything is run in a temporary workspace (config, caches, index, reports).
+
+Results are saved as JSON together with the git commit they were measured on, and can be compared with
+the results of another commit (the exit code is 1 if any benchmark got slower than the threshold).
+
+Usage (from the repository root, next to config.ini):
+    python benchmarks/run_benchmarks.py [--repeat N] [--only NAME ...] [--llm-latency S] [--compare RESULTS.json]
+"""
+import argparse
+import configparser
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows - peak memory of the OCR worker processes isn't reported there
+    resource = None
+
+import parse_config
+from fixtures import FEED_SIZES, load_atom_feed, make_atom_feed, make_article_pdf
+
+# Number of search results the fake arXiv API has for each query
+RESULTS_PER_QUERY = 300
+PDF_PAGE_COUNTS = (5, 20)
+# Pages of the articles used for the end-to-end report benchmarks (the long one is summarized with map-reduce)
+REPORT_PAGE_COUNTS = (20, 60)
+URL_PARAMETER_PATTERN = re.compile(r"[?&](search_query|start|max_results)=([^&]*)")
+
+
+@dataclass
+class Benchmark:
+    """A single benchmarked operation."""
+    name: str
+    run: Callable[[], Any]
+    # Called before each repetition (not timed)
+    setup: Optional[Callable[[], None]] = None
+    # Number of items (e.g. entries, pages) processed by a single run, used to compute the throughput
+    items: int = 0
+    measure_memory: bool = True
+    info: dict = field(default_factory=dict)
+
+
+class FakeArxivResponse:
+    """Response of the fake arXiv API, with the attributes of a streamed requests.Response used by the client."""
+
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.headers = {}
+        self.raw = io.BytesIO(body)
+
+    def raise_for_status(self)->None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.raw.close()
+
+
+class FakeArxivSession:
+    """
+    Stand-in for the requests session of arxiv_api_client, serving synthetic feeds
+    with RESULTS_PER_QUERY results for every query, most recently updated first.
+    """
+
+    def __init__(self, latency: float):
+        """
+        :param latency: Time (in seconds) every request takes.
+        """
+        self.latency = latency
+
+    def get(self, url: str, **kwargs)->FakeArxivResponse:
+        parameters = dict(URL_PARAMETER_PATTERN.findall(url))
+        query = parameters["search_query"].split("+AND+")[0]
+        start = int(parameters["start"])
+        count = max(min(int(parameters["max_results"]), RESULTS_PER_QUERY - start), 0)
+        time.sleep(self.latency)
+        feed = make_atom_feed(count, zlib.crc32(query.encode("utf-8")), start, RESULTS_PER_QUERY)
+        return FakeArxivResponse(feed.encode("utf-8"))
+
+
+def get_git_commit()->dict:
+    """
+    Get the git commit the benchmarks are run on.
+    :return: Dictionary with the commit hash and whether there are uncommitted changes.
+    """
+    def git(*args: str)->str:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or "unknown",
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def create_workspace(workspace: str)->None:
+    """
+    Create a config file using the repository's settings, but with all paths, caches and reports in the workspace,
+    and make the modules use it.
+    :param workspace: Path of the workspace directory.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_ROOT, "config.ini"))
+    overrides = {
+        "filepaths": {"papers_path": os.path.join(workspace, "papers"),
+                      "reports_path": os.path.join(workspace, "reports"),
+                      "paper_index_path": os.path.join(workspace, "paper_index.sqlite")},
+        "cache": {"cache_path": os.path.join(workspace, "cache"), "llm_cache_enabled": "0"},
+        "gemini": {"api_key": "benchmark", "requests_per_minute": "0"},
+        "instrumentation": {"run_reports": "0", "profile": "0"},
+    }
+    if shutil.which(config.get("tesseract", "tesseract_path", fallback="tesseract")) is None:
+        # Pages failing the quality check would otherwise be sent to a missing OCR engine
+        overrides["tesseract"] = {"use_tesseract": "0"}
+    for section, values in overrides.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, value)
+    os.makedirs(os.path.join(workspace, "papers"), exist_ok=True)
+    config_path = os.path.join(workspace, "config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        config.write(f)
+    parse_config.CONFIG_PATH = config_path
+    parse_config.reload_config()
+
+def reset_paper_index(workspace: str)->None:
+    """
+    Start from an empty paper index and paper vector cache, as on the first run.
+    :param workspace: Path of the workspace directory.
+    """
+    import paper_index
+    import paper_prefilter
+
+    if paper_index._paper_index is not None:
+        paper_index._paper_index._connection.close()
+        paper_index._paper_index = None
+    paper_prefilter._vector_index = None
+    for path in (os.path.join(workspace, "paper_index.sqlite"), os.path.join(workspace, "cache", "paper_vectors.npz")):
+        if os.path.exists(path):
+            os.remove(path)
+
+def reset_text_cache(workspace: str)->None:
+    """
+    Remove the cached texts and the generated reports, so that reports are generated from scratch.
+    :param workspace: Path of the workspace directory.
+    """
+    for directory in (os.path.join(workspace, "cache", "text"), os.path.join(workspace, "reports")):
+        shutil.rmtree(directory, ignore_errors=True)
+
+def is_tesseract_available()->bool:
+    """
+    Check whether the tesseract executable configured in the ini file can be run.
+    :return: True if tesseract is available.
+    """
+    return shutil.which(parse_config.get_tesseract_path()) is not None
+
+def get_benchmarks(workspace: str, arxiv_latency: float)->list[Benchmark]:
+    """
+    Prepare the inputs of all benchmarks.
+    :param workspace: Path of the workspace directory.
+    :param arxiv_latency: Time (in seconds) every request to the fake arXiv API takes.
+    :return: The benchmarks.
+    """
+    import arxiv_api_client
+    from arxiv_api_client import parse_atom_response, TokenBucket
+    from paper_filtering import get_papers_with_ratings
+    from pdf_summarization import generate_paper_summary
+    from pdf_text_extraction import read_pdf_plumber, read_pdf_tesseract
+
+    benchmarks = []
+    for size in FEED_SIZES:
+        feed, origin = load_atom_feed(size)
+        benchmarks.append(Benchmark(f"parse_atom_{size}", lambda feed=feed: parse_atom_response(feed), items=size,
+                                    info={"feed": origin, "feed_bytes": len(feed.encode("utf-8"))}))
+
+    tesseract_available = is_tesseract_available()
+    for page_count in PDF_PAGE_COUNTS:
+        pdf_path = os.path.join(workspace, f"pages_{page_count}.pdf")
+        make_article_pdf(pdf_path, page_count, garbled_every=0)
+        benchmarks.append(Benchmark(f"read_pdf_plumber_{page_count}", lambda path=pdf_path: read_pdf_plumber(path),
+                                    items=page_count))
+        if tesseract_available:
+            # OCR runs in worker processes, whose peak memory is reported instead
+            benchmarks.append(Benchmark(f"read_pdf_tesseract_{page_count}", lambda path=pdf_path: read_pdf_tesseract(path),
+                                        items=page_count, measure_memory=False))
+
+    # The arXiv client is pointed to the fake API, without the rate limit of the real one
+    arxiv_api_client.session = FakeArxivSession(arxiv_latency)
+    arxiv_api_client.rate_limiter = TokenBucket(rate=1e9, capacity=1e9)
+    interests = parse_config.get_interests()
+    benchmarks.append(Benchmark("papers_with_ratings", get_papers_with_ratings, setup=lambda: reset_paper_index(workspace),
+                                items=len(interests) * min(RESULTS_PER_QUERY, parse_config.get_papers_per_interest())))
+
+    for page_count in REPORT_PAGE_COUNTS:
+        filename = f"article_{page_count}.pdf"
+        make_article_pdf(os.path.join(parse_config.get_papers_path(), filename), page_count)
+        benchmarks.append(Benchmark(f"generate_paper_summary_{page_count}",
+                                    lambda filename=filename: generate_paper_summary(filename),
+                                    setup=lambda: reset_text_cache(workspace), items=page_count, measure_memory=False))
+    return benchmarks
+
+def run_benchmark(benchmark: Benchmark, repeat: int)->dict:
+    """
+    Run the benchmark once as a warm-up and then `repeat` times measuring the time,
+    plus once more measuring the peak memory (tracemalloc slows down the code, so it's not used while timing).
+    :param benchmark: The benchmark.
+    :param repeat: Number of timed repetitions.
+    :return: Results of the benchmark.
+    """
+    from instrumentation import get_stage_stats, reset_stage_stats
+
+    times = []
+    for repetition in range(repeat + 1):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        reset_stage_stats()
+        start = time.perf_counter()
+        benchmark.run()
+        if repetition > 0:
+            times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    result = {
+        "median": median,
+        "min": min(times),
+        "max": max(times),
+        "repeat": repeat,
+        "items": benchmark.items,
+        "items_per_second": benchmark.items / median if median > 0 else None,
+        # Breakdown of the last repetition by pipeline stage (see instrumentation.py)
+        "stages": {stage: {"wall_time": stats.wall_time, "calls": stats.calls, "llm_calls": stats.llm_calls}
+                   for stage, stats in get_stage_stats().items()},
+        **benchmark.info,
+    }
+
+    if benchmark.measure_memory:
+        if benchmark.setup is not None:
+            benchmark.setup()
+        tracemalloc.start()
+        try:
+            benchmark.run()
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    elif resource is not None:
+        # Peak over all worker processes that finished so far (including earlier benchmarks)
+        result["children_max_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return result
+
+def compare_results(results: dict, baseline: dict, threshold: float)->bool:
+    """
+    Print the change of the median time of each benchmark compared to the baseline.
+    :param results: Current results.
+    :param baseline: Results to compare with.
+    :param threshold: Relative slowdown (e.g. 0.1 for 10%) above which a benchmark counts as a regression.
+    :return: True if any benchmark regressed.
+    """
+    print(f"\nCompared with {baseline['commit'][:10]}{' (dirty)' if baseline.get('dirty') else ''}:")
+    print(f"{'benchmark':<32}{'before [s]':>12}{'after [s]':>12}{'change':>10}")
+    regressed = False
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        before = baseline["benchmarks"][name]["median"]
+        after = result["median"]
+        change = after / before - 1 if before > 0 else 0.0
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressed = True
+        print(f"{name:<32}{before:>12.4f}{after:>12.4f}{change:>+10.1%}{marker}")
+    return regressed
+
+def main()->None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions of each benchmark.")
+    parser.add_argument("--only", nargs="+", help="Run only the benchmarks whose names start with these prefixes.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Latency of every LLM call in seconds.")
+    parser.add_argument("--arxiv-latency", type=float, default=0.0, help="Latency of every arXiv request in seconds.")
+    parser.add_argument("--output", help="Path of the JSON results (default: benchmarks/results/<commit>.json).")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown counted as a regression when comparing (default: 0.1).")
+    args = parser.parse_args()
+
+    from fake_llm import make_fake_llm_factory
+    from model import set_llm_factory
+
+    commit = get_git_commit()
+    results = {
+        **commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "llm_latency": args.llm_latency,
+        "arxiv_latency": args.arxiv_latency,
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="research_digest_benchmarks_") as workspace:
+        create_workspace(workspace)
+        set_llm_factory(make_fake_llm_factory(args.llm_latency))
+        benchmarks = get_benchmarks(workspace, args.arxiv_latency)
+        if args.only:
+            benchmarks = [x for x in benchmarks if x.name.startswith(tuple(args.only))]
+
+        print(f"{'benchmark':<32}{'median [s]':>12}{'min [s]':>12}{'items/s':>12}")
+        for benchmark in benchmarks:
+            result = run_benchmark(benchmark, args.repeat)
+            results["benchmarks"][benchmark.name] = result
+            items_per_second = result["items_per_second"] or 0.0
+            print(f"{benchmark.name:<32}{result['median']:>12.4f}{result['min']:>12.4f}{items_per_second:>12.1f}")
+        if not is_tesseract_available():
+            print("(tesseract not available - OCR benchmarks skipped)")
+
+    output_path = args.output
+    if output_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"{commit['commit'][:10]}{'-dirty' if commit['dirty'] else ''}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
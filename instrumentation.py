@@ -0,0 +1,268 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, Iterator, Iterable, Optional, TypeVar
+
+from parse_config import get_run_reports_enabled, get_run_reports_path, get_profile_enabled
+
+T = TypeVar("T")
+
+# Stage name used for LLM calls made outside of any timed stage
+UNSTAGED = "unstaged"
+
+
+@dataclass
+class StageStats:
+    """Timings and resource usage accumulated for a single pipeline stage."""
+    calls: int = 0
+    items: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    pages: int = 0
+    bytes_processed: int = 0
+    llm_calls: int = 0
+    llm_cache_hits: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    first_start: float = 0.0
+    last_end: float = 0.0
+
+_stage_stats: dict[str, StageStats] = {}
+_stats_lock = threading.Lock()
+
+# Statistics of the innermost stage running in the current context, which LLM usage is attributed to
+_current_stage: ContextVar[Optional[StageStats]] = ContextVar("current_stage", default=None)
+
+# Set by the LLM cache when a lookup hits, so that the tokens of the cached response aren't counted as spent
+_thread_state = threading.local()
+
+def _merge_stage_stats(stage: str, record: StageStats)->None:
+    """
+    Add the statistics of a single call of a stage to the totals of the stage.
+    :param stage: Name of the stage.
+    :param record: Statistics of the call.
+    """
+    with _stats_lock:
+        stats = _stage_stats.setdefault(stage, StageStats(first_start=record.first_start))
+        for field in ("calls", "items", "wall_time", "cpu_time", "pages", "bytes_processed",
+                      "llm_calls", "llm_cache_hits", "prompt_tokens", "output_tokens"):
+            setattr(stats, field, getattr(stats, field) + getattr(record, field))
+        stats.first_start = min(stats.first_start, record.first_start)
+        stats.last_end = max(stats.last_end, record.last_end)
+
+@contextmanager
+def timed_stage(stage: str, items: int = 1)->Iterator[StageStats]:
+    """
+    Measure the time spent in a pipeline stage.
+    Can be used concurrently from multiple threads. CPU time is that of the calling thread, plus any added to the
+    returned record (e.g. CPU time of worker processes).
+    LLM calls made inside the stage (in the same thread) are counted towards it - towards the innermost one if stages are nested.
+    :param stage: Name of the stage.
+    :param items: Number of items (e.g. papers) processed by this call.
+    :return: Statistics of this call, whose counters (e.g. pages, bytes_processed) can be updated inside the block.
+    """
+    record = StageStats(calls=1, items=items)
+    token = _current_stage.set(record)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield record
+    finally:
+        end = time.perf_counter()
+        record.cpu_time += time.thread_time() - cpu_start
+        record.wall_time = end - start
+        record.first_start = start
+        record.last_end = end
+        _current_stage.reset(token)
+        _merge_stage_stats(stage, record)
+
+def timed_iter(stage: str, iterable: Iterable[T], get_bytes_processed: Optional[Callable[[], int]] = None)->Iterator[T]:
+    """
+    Measure the time spent producing the items of an iterable (e.g. a streamed download), as a single call of a stage.
+    Only the time spent inside the iterable counts, not the time the consumer spends between items.
+    :param stage: Name of the stage.
+    :param iterable: Iterable to measure.
+    :param get_bytes_processed: If given, called once the iteration ends to get the number of bytes processed.
+    :return: Iterator over the items of the iterable.
+    """
+    record = StageStats(calls=1)
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            cpu_start = time.thread_time()
+            token = _current_stage.set(record)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_stage.reset(token)
+                end = time.perf_counter()
+                record.cpu_time += time.thread_time() - cpu_start
+                record.wall_time += end - start
+                record.first_start = record.first_start or start
+                record.last_end = end
+            record.items += 1
+            yield item
+    finally:
+        if get_bytes_processed is not None:
+            record.bytes_processed = get_bytes_processed()
+        _merge_stage_stats(stage, record)
+
+def record_llm_cache_hit()->None:
+    """
+    Mark the LLM call in progress in this thread as answered from the cache.
+    """
+    _thread_state.cache_hit = True
+
+def record_llm_call(prompt_tokens: int, output_tokens: int)->None:
+    """
+    Count a finished LLM call (and its token usage, unless it was answered from the cache) towards the current stage.
+    :param prompt_tokens: Number of tokens in the prompt.
+    :param output_tokens: Number of tokens in the response.
+    """
+    cache_hit = getattr(_thread_state, "cache_hit", False)
+    _thread_state.cache_hit = False
+    record = _current_stage.get()
+    with _stats_lock:
+        if record is None:
+            record = _stage_stats.setdefault(UNSTAGED, StageStats())
+        record.llm_calls += 1
+        if cache_hit:
+            record.llm_cache_hits += 1
+        else:
+            record.prompt_tokens += prompt_tokens
+            record.output_tokens += output_tokens
+
+def get_stage_stats()->dict[str, StageStats]:
+    """
+    Get the statistics recorded so far for each stage.
+    :return: Dictionary mapping stage names to their statistics.
+    """
+    with _stats_lock:
+        return {stage: StageStats(**vars(stats)) for stage, stats in _stage_stats.items()}
+
+def reset_stage_stats()->None:
+    """
+    Remove all recorded statistics.
+    """
+    with _stats_lock:
+        _stage_stats.clear()
+
+def format_stage_summary()->str:
+    """
+    Format the recorded statistics as a table with the throughput and LLM token usage of each stage.
+    Throughput is computed over the time between the first call starting and the last one ending,
+    so it accounts for calls running concurrently.
+    :return: Text table with one row per stage.
+    """
+    lines = [f"{'Stage':<24}{'Items':>8}{'Busy [s]':>12}{'CPU [s]':>10}{'Elapsed [s]':>14}{'Items/min':>12}"
+             f"{'Prompt tok.':>13}{'Output tok.':>13}"]
+    for stage, stats in get_stage_stats().items():
+        elapsed = stats.last_end - stats.first_start
+        throughput = stats.items / elapsed * 60 if elapsed > 0 else 0.0
+        lines.append(f"{stage:<24}{stats.items:>8}{stats.wall_time:>12.1f}{stats.cpu_time:>10.1f}{elapsed:>14.1f}"
+                     f"{throughput:>12.2f}{stats.prompt_tokens:>13}{stats.output_tokens:>13}")
+    return "\n".join(lines)
+
+def get_run_report(run_name: str, wall_time: float)->dict:
+    """
+    Get the recorded statistics as a JSON-serializable run report.
+    :param run_name: Name of the run (e.g. the entry point).
+    :param wall_time: Total duration of the run in seconds.
+    :return: Dictionary with the statistics of each stage and the LLM usage totals.
+    """
+    stages = get_stage_stats()
+    report_stages = {}
+    for stage, stats in stages.items():
+        report_stages[stage] = asdict(stats)
+        report_stages[stage]["elapsed"] = stats.last_end - stats.first_start
+        del report_stages[stage]["first_start"], report_stages[stage]["last_end"]
+    return {
+        "run": run_name,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_time": wall_time,
+        "stages": report_stages,
+        "totals": {field: sum(getattr(stats, field) for stats in stages.values())
+                   for field in ("llm_calls", "llm_cache_hits", "prompt_tokens", "output_tokens")},
+    }
+
+@contextmanager
+def _profile_all_threads()->Iterator[pstats.Stats]:
+    """
+    Profile the calling thread and all threads started inside the block (e.g. thread pool workers) with cProfile.
+    Since Python 3.12 cProfile is built on sys.monitoring, which allows only one active profiler per process,
+    so there only the calling thread is profiled.
+    :return: Statistics, filled in when the block exits.
+    """
+    profile_threads = sys.version_info < (3, 12)
+    profilers = []
+    profilers_lock = threading.Lock()
+
+    def start_thread_profiler(*_)->None:
+        # Called on the first profiling event of every new thread - the cProfile profiler then replaces this hook
+        profiler = cProfile.Profile()
+        with profilers_lock:
+            profilers.append(profiler)
+        profiler.enable()
+
+    stats = pstats.Stats()
+    main_profiler = cProfile.Profile()
+    if profile_threads:
+        threading.setprofile(start_thread_profiler)
+    main_profiler.enable()
+    try:
+        yield stats
+    finally:
+        main_profiler.disable()
+        if profile_threads:
+            threading.setprofile(None)
+        stats.add(main_profiler)
+        with profilers_lock:
+            for profiler in profilers:
+                stats.add(profiler)
+
+def save_run_report(run_name: str, wall_time: float, profile_stats: Optional[pstats.Stats] = None)->None:
+    """
+    Save the recorded statistics as a JSON run report (if enabled) and the profile (if given)
+    to the `run_reports_path` directory configured in the ini file.
+    :param run_name: Name of the run (used in the filenames).
+    :param wall_time: Total duration of the run in seconds.
+    :param profile_stats: Profile of the run, or None if it wasn't profiled.
+    """
+    reports_enabled = get_run_reports_enabled()
+    if not reports_enabled and profile_stats is None:
+        return
+    reports_dir = get_run_reports_path()
+    os.makedirs(reports_dir, exist_ok=True)
+    base_path = os.path.join(reports_dir, f"{run_name}-{datetime.now():%Y%m%d-%H%M%S}")
+    if reports_enabled:
+        with open(base_path + ".json", "w", encoding="utf-8") as f:
+            json.dump(get_run_report(run_name, wall_time), f, indent=2)
+    if profile_stats is not None:
+        profile_stats.dump_stats(base_path + ".prof")
+
+@contextmanager
+def instrumented_run(run_name: str)->Iterator[None]:
+    """
+    Record the statistics of a pipeline run, starting from empty ones, and save a run report afterward
+    (also if the run fails). With `profile` enabled in the ini file, the run is also profiled with cProfile.
+    :param run_name: Name of the run (used in the report filenames).
+    """
+    reset_stage_stats()
+    profile_stats = None
+    start = time.perf_counter()
+    try:
+        with _profile_all_threads() if get_profile_enabled() else nullcontext() as profile_stats:
+            yield
+    finally:
+        save_run_report(run_name, time.perf_counter() - start, profile_stats)
\ No newline at end of file
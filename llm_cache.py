@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Optional
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from instrumentation import record_llm_cache_hit
+from parse_config import get_cache_path, get_llm_cache_enabled, get_llm_cache_ttl_hours, get_llm_cache_max_entries
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    SQLite-backed cache of LLM responses with TTL and max-size (least recently used) eviction.
+
+    Entries are keyed on the prompt and the LLM string generated by langchain, which contains the model name,
+    temperature and any bound parameters, including the structured output schema.
+    """
+
+    def __init__(self, database_path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        :param database_path: Path of the SQLite database file.
+        :param ttl_seconds: Time after which entries expire (None for no expiration).
+        :param max_entries: Maximum number of entries kept in the cache (None for no limit).
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, generations TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_access ON llm_responses (last_access)")
+        self._connection.commit()
+
+    @staticmethod
+    def _get_key(prompt: str, llm_string: str)->str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str)->Optional[RETURN_VAL_TYPE]:
+        key = self._get_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT generations, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and row[1] + self.ttl_seconds < now:
+                self._connection.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._connection.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        record_llm_cache_hit()
+        # loads is marked as beta and would otherwise warn on every cache hit
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE)->None:
+        key = self._get_key(prompt, llm_string)
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, generations, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, generations, now, now),
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "SELECT key FROM llm_responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._connection.commit()
+
+    def clear(self, **kwargs: Any)->None:
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_responses")
+            self._connection.commit()
+
+    def get_stats(self)->dict[str, int]:
+        """
+        Get the hit / miss counters of the cache.
+        :return: Dictionary with the number of hits, misses and entries currently stored.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache()->Optional[PersistentLLMCache]:
+    """
+    Get the process-wide LLM response cache configured in the ini file.
+    :return: The cache, or None if caching is disabled.
+    """
+    global _llm_cache
+    if not get_llm_cache_enabled():
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            cache_dir = get_cache_path()
+            os.makedirs(cache_dir, exist_ok=True)
+            ttl_hours = get_llm_cache_ttl_hours()
+            max_entries = get_llm_cache_max_entries()
+            _llm_cache = PersistentLLMCache(
+                os.path.join(cache_dir, "llm_cache.sqlite"),
+                ttl_seconds=ttl_hours * 3600 if ttl_hours > 0 else None,
+                max_entries=max_entries if max_entries > 0 else None,
+            )
+    return _llm_cache
\ No newline at end of file
@@ -0,0 +1,21 @@
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from instrumentation import record_llm_call
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler recording the token usage of every LLM call in the pipeline stage it was made from.
+    """
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any)->None:
+        prompt_tokens = 0
+        output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        record_llm_call(prompt_tokens, output_tokens)
\ No newline at end of file
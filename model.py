@@ -1,8 +1,66 @@
-from parse_config import get_api_key
-from langchain_google_genai import ChatGoogleGenerativeAI
+from parse_config import get_api_key, get_requests_per_minute
 import os
+import threading
+from typing import Callable, Optional, TYPE_CHECKING
+
+# The LLM client libraries are slow to import, so they're only imported once an LLM is actually needed
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.rate_limiters import InMemoryRateLimiter
+
+# Creates the LLM instead of get_llm's default (e.g. a stand-in for offline benchmarks), if set
+_llm_factory: Optional[Callable[[], "BaseChatModel"]] = None
+
+# Number of LLM requests that can be made at once without waiting (e.g. the explanation and pros / cons of a report)
+RATE_LIMIT_BURST = 2
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter()->Optional["InMemoryRateLimiter"]:
+    """
+    Get the process-wide rate limiter shared by all LLM clients, configured with `requests_per_minute` in the ini file.
+    Cached responses don't count towards the limit. The bucket starts full, so the first requests of a process
+    (up to RATE_LIMIT_BURST of them) go out immediately.
+    :return: The rate limiter, or None if rate limiting is disabled.
+    """
+    global _rate_limiter
+    requests_per_minute = get_requests_per_minute()
+    if requests_per_minute <= 0:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            from langchain_core.rate_limiters import InMemoryRateLimiter
+            _rate_limiter = InMemoryRateLimiter(requests_per_second=requests_per_minute / 60,
+                                                max_bucket_size=RATE_LIMIT_BURST)
+            # The langchain limiter starts with an empty bucket, which would delay the first request by a full interval
+            _rate_limiter.available_tokens = RATE_LIMIT_BURST
+    return _rate_limiter
+
+def estimate_tokens(text: str)->int:
+    """
+    Roughly estimate the number of tokens in the text (about 4 characters per token for English text).
+    :param text: Text to estimate the length of.
+    :return: Estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+def set_llm_factory(llm_factory: Optional[Callable[[], "BaseChatModel"]])->None:
+    """
+    Replace the LLM returned by get_llm, e.g. with a stand-in that doesn't need network access or an API key.
+    :param llm_factory: Function creating the LLM to return, or None to restore the default Gemini LLM.
+    """
+    global _llm_factory
+    _llm_factory = llm_factory
+
+def get_llm()->"BaseChatModel":
+    if _llm_factory is not None:
+        return _llm_factory()
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from llm_cache import get_llm_cache
+    from llm_usage import UsageCallbackHandler
 
-def get_llm()->ChatGoogleGenerativeAI:
     api_key = get_api_key()
 
     if "GOOGLE_API_KEY" not in os.environ:
@@ -13,7 +71,10 @@ def get_llm()->ChatGoogleGenerativeAI:
         temperature=0,
         max_tokens=None,
         timeout=None,
-        max_retries=2
+        max_retries=2,
+        cache=get_llm_cache(),
+        rate_limiter=get_rate_limiter(),
+        callbacks=[UsageCallbackHandler()],
     )
 
     return llm
\ No newline at end of file
@@ -1,16 +1,22 @@
-import statistics
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Sequence
+from typing import Sequence, Optional, TYPE_CHECKING
 
-from arxiv_api_client import get_papers, Paper
-from arxiv_api_tool import paper_to_str
-from pydantic import BaseModel, Field
-from model import get_llm
-from parse_config import get_interests
-import time
-from langchain_core.prompts import PromptTemplate
+from arxiv_api_client import Paper, split_arxiv_id, paper_to_str
+from instrumentation import timed_stage, instrumented_run
+from paper_index import get_recent_papers, get_paper_index
+from paper_prefilter import prefilter_papers
+from paper_scoring import get_scores, get_top_indices
+from pydantic import BaseModel, Field, ValidationError
+from model import get_llm, estimate_tokens
+from parse_config import get_interests, get_papers_per_interest, get_rating_batch_tokens, get_rating_workers, \
+    get_rating_retries, get_prefilter_enabled, get_prefilter_top_k
 
-rating_prompt_template = PromptTemplate.from_template("Rate the novelty, clarity and impact of the following papers. Provide a comment on why the paper might be interesting. \n\n\n {papers}")
+if TYPE_CHECKING:
+    from langchain_core.runnables import Runnable
+
+# Plain format string rather than a PromptTemplate - langchain is only imported once papers actually need rating
+rating_prompt_template = "Rate the novelty, clarity and impact of the following papers. Provide a comment on why the paper might be interesting. \n\n\n {papers}"
 
 
 class PaperRating(BaseModel):
@@ -37,50 +43,183 @@ class PaperWithRatings:
 def get_summary_paper_score(paper_rating: PaperRating)->float:
     """
     Using scores for novelty, clarity and impact generated by the LLM, average them to a single score for the paper.
+    The criteria are weighted with the `rating_weights` configured in the ini file.
     :param paper_rating: Object containing the paper ratings
-    :return: Mean rating of the paper
+    :return: Weighted mean rating of the paper
+    """
+    return float(get_scores([paper_rating])[0])
+
+def deduplicate_papers(papers: Sequence[Paper])->list[Paper]:
+    """
+    Remove duplicate papers (e.g. ones found for multiple interests), including other versions of the same paper.
+    Papers are kept in the order they first appear, as their most recently updated version.
+    :param papers: Papers to deduplicate.
+    :return: List of unique papers.
+    """
+    unique_papers = {}
+    for paper in papers:
+        arxiv_id = split_arxiv_id(paper.id)[0]
+        if arxiv_id not in unique_papers or paper.updated > unique_papers[arxiv_id].updated:
+            unique_papers[arxiv_id] = paper
+    return list(unique_papers.values())
+
+def batch_papers(papers: Sequence[Paper], token_budget: int, paper_strings: dict[str, str])->list[list[Paper]]:
+    """
+    Split papers into batches whose prompts fit in the token budget (estimated).
+    A paper larger than the budget gets a batch of its own.
+    :param papers: Papers to split.
+    :param token_budget: Maximum estimated number of tokens of the papers in a single batch.
+    :param paper_strings: Dictionary mapping paper ids to their string representation (from paper_to_str).
+    :return: List of batches of papers.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for paper in papers:
+        paper_tokens = estimate_tokens(paper_strings[paper.id])
+        if batch and batch_tokens + paper_tokens > token_budget:
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(paper)
+        batch_tokens += paper_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def rate_paper_batch(papers: Sequence[Paper], structured_llm: "Runnable", paper_strings: dict[str, str])->list[PaperWithRatings]:
+    """
+    Use an LLM to rate a single batch of papers.
+    :param papers: Papers to rate.
+    :param structured_llm: LLM returning PaperRatings objects.
+    :param paper_strings: Dictionary mapping paper ids to their string representation (from paper_to_str).
+    :return: Ratings of the papers that were rated (ratings of papers from outside the batch are discarded).
+    """
+    papers_str = [paper_strings[x.id] for x in papers]
+    papers_str = "\n---\n".join(papers_str)
+    prompt = rating_prompt_template.format(papers=papers_str)
+    with timed_stage("rating llm", items=len(papers)) as stats:
+        stats.bytes_processed = len(papers_str.encode("utf-8"))
+        result = structured_llm.invoke(
+            prompt
+        )
+
+    # The LLM may or may not include the URL prefix and version in the id, so papers are matched on the bare arXiv id
+    papers_by_id = {split_arxiv_id(x.id)[0]: x for x in papers}
+    papers_with_ratings = {}
+    for rating in result.paper_ratings:
+        paper = papers_by_id.get(split_arxiv_id(rating.paper_id)[0])
+        if paper is not None and paper.id not in papers_with_ratings:
+            papers_with_ratings[paper.id] = PaperWithRatings(paper, rating)
+
+    return list(papers_with_ratings.values())
+
+def _rate_batch_halves(papers: Sequence[Paper], structured_llm: "Runnable", paper_strings: dict[str, str],
+                       retries: int)->list[PaperWithRatings]:
+    """
+    Split a batch of papers in half and rate both halves separately.
+    :param papers: Papers to rate (at least two).
+    :param structured_llm: LLM returning PaperRatings objects.
+    :param paper_strings: Dictionary mapping paper ids to their string representation (from paper_to_str).
+    :param retries: Number of retries left for each half.
+    :return: Ratings of the papers that were rated.
+    """
+    middle = (len(papers) + 1) // 2
+    return [rating for half in (papers[:middle], papers[middle:])
+            for rating in rate_paper_batch_with_retries(half, structured_llm, paper_strings, retries)]
+
+def rate_paper_batch_with_retries(papers: Sequence[Paper], structured_llm: "Runnable", paper_strings: dict[str, str],
+                                  retries: int)->list[PaperWithRatings]:
     """
-    return statistics.mean([paper_rating.novelty, paper_rating.clarity, paper_rating.impact])
+    Rate a batch of papers, retrying the papers that are missing from the output.
+    If the output fails to validate or none of the papers were rated, the batch is split in half and both halves
+    are retried separately (repeating the same prompt would only return the same cached response).
+    :param papers: Papers to rate.
+    :param structured_llm: LLM returning PaperRatings objects.
+    :param paper_strings: Dictionary mapping paper ids to their string representation (from paper_to_str).
+    :param retries: Number of retries left.
+    :return: Ratings of the papers that were rated.
+    """
+    from langchain_core.exceptions import OutputParserException
+
+    try:
+        papers_with_ratings = rate_paper_batch(papers, structured_llm, paper_strings)
+    except (OutputParserException, ValidationError) as e:
+        if retries <= 0 or len(papers) < 2:
+            print(f"Failed to rate {len(papers)} paper(s): {e}")
+            return []
+        return _rate_batch_halves(papers, structured_llm, paper_strings, retries - 1)
+
+    rated_ids = {x.paper.id for x in papers_with_ratings}
+    missing_papers = [x for x in papers if x.id not in rated_ids]
+    if missing_papers and len(missing_papers) == len(papers) and len(papers) > 1 and retries > 0:
+        return _rate_batch_halves(papers, structured_llm, paper_strings, retries - 1)
+    if missing_papers and len(missing_papers) < len(papers) and retries > 0:
+        papers_with_ratings.extend(rate_paper_batch_with_retries(missing_papers, structured_llm, paper_strings, retries - 1))
+    elif missing_papers:
+        print(f"Failed to rate {len(missing_papers)} paper(s): missing from the LLM output")
+    return papers_with_ratings
+
+def rate_papers(papers: Sequence[Paper])->Sequence[PaperWithRatings]:
+    """
+    Use an LLM to rate the given papers.
+    Papers are split into batches fitting in `rating_batch_tokens`, which are rated concurrently (`rating_workers`).
+    Batches with missing or invalid ratings are retried on their own (up to `rating_retries` times).
+    :param papers: Papers to rate.
+    :return: Sequence of PaperWithRatings objects
+    """
+    llm = get_llm()
+    structured_llm_json = llm.with_structured_output(PaperRatings, method="json_schema")
+    # Papers are formatted once and reused for batching, prompts and retries
+    paper_strings = {x.id: paper_to_str(x) for x in papers}
+    batches = batch_papers(papers, get_rating_batch_tokens(), paper_strings)
+    retries = get_rating_retries()
+
+    with ThreadPoolExecutor(max_workers=get_rating_workers()) as executor:
+        batch_ratings = executor.map(
+            lambda batch: rate_paper_batch_with_retries(batch, structured_llm_json, paper_strings, retries), batches
+        )
+        return [rating for ratings in batch_ratings for rating in ratings]
 
 def get_papers_with_ratings()->Sequence[PaperWithRatings]:
     """
     Get papers and their ratings for recently published papers from the domains the user is interested in.
+    Candidates are narrowed down with a local similarity pre-filter (if enabled), and ratings are stored in the paper index,
+    so only papers (or paper versions) that weren't rated before are sent to the LLM.
     :return: Sequence of PaperWithRatings objects
     """
     interests = get_interests()
     papers = []
     for interest in interests:
-        papers.extend(get_papers(interest, 20, 0, True))
-        time.sleep(3.5) # ArXiv API has a 1 request per 3 seconds rate limit
-    papers_str = [paper_to_str(x) for x in papers]
-    papers_str = "\n---\n".join(papers_str)
-    llm = get_llm()
-    structured_llm_json = llm.with_structured_output(PaperRatings, method="json_schema")
-
-    # Gemini-2.5-flash has a 1M context window so splitting up the documents is likely not needed - they're just abstracts
-
-    prompt = rating_prompt_template.format(papers=papers_str)
-    result = structured_llm_json.invoke(
-        prompt
-    )
-
-    papers_with_ratings = []
-    for rating in result.paper_ratings:
-        paper_id = rating.paper_id
-        paper = next((x for x in papers if paper_id in x.id), None)
-        papers_with_ratings.append(PaperWithRatings(paper, rating))
+        papers.extend(get_recent_papers(interest, get_papers_per_interest()))
+    papers = deduplicate_papers(papers)
+    if get_prefilter_enabled():
+        with timed_stage("prefilter", items=len(papers)):
+            papers = prefilter_papers(papers, interests, get_prefilter_top_k())
+
+    paper_index = get_paper_index()
+    stored_ratings = paper_index.get_ratings([x.id for x in papers])
+    papers_with_ratings = [PaperWithRatings(x, PaperRating.model_validate_json(stored_ratings[x.id]))
+                           for x in papers if x.id in stored_ratings]
+
+    unrated_papers = [x for x in papers if x.id not in stored_ratings]
+    if unrated_papers:
+        new_ratings = rate_papers(unrated_papers)
+        paper_index.add_ratings({x.paper.id: x.ratings.model_dump_json() for x in new_ratings if x.paper is not None})
+        papers_with_ratings.extend(new_ratings)
 
     return papers_with_ratings
 
-def sort_papers(papers_with_ratings: Sequence[PaperWithRatings])->Sequence[PaperWithRatings]:
+def sort_papers(papers_with_ratings: Sequence[PaperWithRatings], n: Optional[int] = None)->Sequence[PaperWithRatings]:
     """
     Sort an iterable of PaperWithRatings objects according to their summary rating.
     :param papers_with_ratings: The papers (with ratings) to process.
+    :param n: If given, only the n best papers are selected (using a partial sort).
     :return: The papers sorted by descending average score.
     """
-    papers_by_score = list(papers_with_ratings)
-    papers_by_score.sort(key=lambda p: get_summary_paper_score(p.ratings), reverse=True)
-    return papers_by_score
+    papers_with_ratings = list(papers_with_ratings)
+    scores = get_scores([x.ratings for x in papers_with_ratings])
+    return [papers_with_ratings[i] for i in get_top_indices(scores, n)]
 
 def get_most_interesting_papers(n: int)->Sequence[PaperWithRatings]:
     """
@@ -88,9 +227,9 @@ def get_most_interesting_papers(n: int)->Sequence[PaperWithRatings]:
     :param n: Number of papers to return
     :return: Iterable of PaperWithRatings sorted by descending average score.
     """
-    ratings = get_papers_with_ratings()
-    sorted_papers = sort_papers(ratings)
-    return sorted_papers[:n]
+    with instrumented_run("ranking"):
+        ratings = get_papers_with_ratings()
+        return sort_papers(ratings, n)
 
 if __name__ == "__main__":
     for x in get_most_interesting_papers(10):
@@ -0,0 +1,301 @@
+import json
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from arxiv_api_client import get_papers, split_arxiv_id, datetime_to_arxiv_str, Paper
+from parse_config import get_paper_index_path, get_harvest_page_size, get_harvest_max_pages
+
+
+class PaperIndex:
+    """
+    Local SQLite store of papers retrieved from arXiv, with a high-water mark (latest `updated` timestamp seen)
+    for every search query, so that repeated harvests only download papers that are new since the last run.
+    Papers a harvest skipped after hitting its page limit are tracked as a backfill range, harvested by later runs.
+    Papers are stored by their arXiv id without the version, so a revised paper replaces its older versions.
+    """
+
+    def __init__(self, database_path: str):
+        """
+        :param database_path: Path of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(papers)")]
+        if columns and "arxiv_id" not in columns:
+            # Indexes from before papers were keyed by the unversioned id are harvested again (ratings are kept)
+            self._connection.executescript(
+                "DROP TABLE papers; DROP TABLE IF EXISTS query_papers; "
+                "DROP TABLE IF EXISTS query_state; DROP TABLE IF EXISTS query_backfill;"
+            )
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "arxiv_id TEXT PRIMARY KEY, id TEXT NOT NULL, updated TEXT NOT NULL, published TEXT NOT NULL, "
+            "title TEXT, summary TEXT, authors TEXT, paper_link TEXT, paper_pdf_link TEXT);"
+            "CREATE TABLE IF NOT EXISTS query_papers ("
+            "query TEXT NOT NULL, arxiv_id TEXT NOT NULL, PRIMARY KEY (query, arxiv_id));"
+            "CREATE TABLE IF NOT EXISTS query_state ("
+            "query TEXT PRIMARY KEY, high_water_mark TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS query_backfill ("
+            "query TEXT PRIMARY KEY, oldest TEXT NOT NULL, newest TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS ratings ("
+            "arxiv_id TEXT NOT NULL, version TEXT NOT NULL, rating TEXT NOT NULL, PRIMARY KEY (arxiv_id, version));"
+        )
+        self._connection.commit()
+
+    def get_high_water_mark(self, query: str)->Optional[datetime]:
+        """
+        Get the latest `updated` timestamp of the papers harvested for the query.
+        :param query: Search query.
+        :return: The timestamp, or None if the query was never harvested.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT high_water_mark FROM query_state WHERE query = ?", (query,)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row is not None else None
+
+    def set_high_water_mark(self, query: str, high_water_mark: datetime)->None:
+        """
+        Save the latest `updated` timestamp of the papers harvested for the query.
+        :param query: Search query.
+        :param high_water_mark: The timestamp.
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_state (query, high_water_mark) VALUES (?, ?)",
+                (query, high_water_mark.isoformat()),
+            )
+            self._connection.commit()
+
+    def get_backfill_range(self, query: str)->Optional[tuple[datetime, datetime]]:
+        """
+        Get the range of `updated` timestamps of the papers a harvest of the query skipped after hitting the page limit.
+        :param query: Search query.
+        :return: Tuple of the oldest and newest timestamps of the range, or None if no papers were skipped.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT oldest, newest FROM query_backfill WHERE query = ?", (query,)
+            ).fetchone()
+        return (datetime.fromisoformat(row[0]), datetime.fromisoformat(row[1])) if row is not None else None
+
+    def set_backfill_range(self, query: str, backfill_range: Optional[tuple[datetime, datetime]])->None:
+        """
+        Save the range of `updated` timestamps of the papers that are still to be harvested for the query.
+        :param query: Search query.
+        :param backfill_range: Tuple of the oldest and newest timestamps of the range, or None if nothing is left.
+        """
+        with self._lock:
+            if backfill_range is None:
+                self._connection.execute("DELETE FROM query_backfill WHERE query = ?", (query,))
+            else:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO query_backfill (query, oldest, newest) VALUES (?, ?, ?)",
+                    (query, backfill_range[0].isoformat(), backfill_range[1].isoformat()),
+                )
+            self._connection.commit()
+
+    def add_papers(self, query: str, papers: list[Paper])->None:
+        """
+        Store (or update) papers retrieved for the query. A stored paper is replaced by a more recently updated version.
+        :param query: Search query the papers were retrieved for.
+        :param papers: Papers to store.
+        """
+        with self._lock:
+            self._connection.executemany(
+                "INSERT INTO papers "
+                "(arxiv_id, id, updated, published, title, summary, authors, paper_link, paper_pdf_link) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (arxiv_id) DO UPDATE SET id = excluded.id, updated = excluded.updated, "
+                "published = excluded.published, title = excluded.title, summary = excluded.summary, "
+                "authors = excluded.authors, paper_link = excluded.paper_link, paper_pdf_link = excluded.paper_pdf_link "
+                "WHERE excluded.updated >= papers.updated",
+                [(split_arxiv_id(paper.id)[0], paper.id, paper.updated.isoformat(), paper.published.isoformat(),
+                  paper.title, paper.summary, json.dumps(paper.authors), paper.paper_link, paper.paper_pdf_link)
+                 for paper in papers],
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO query_papers (query, arxiv_id) VALUES (?, ?)",
+                [(query, split_arxiv_id(paper.id)[0]) for paper in papers],
+            )
+            self._connection.commit()
+
+    def get_papers(self, query: str, published_after: Optional[datetime] = None, limit: Optional[int] = None)->list[Paper]:
+        """
+        Get the stored papers retrieved for the query, most recently updated first.
+        :param query: Search query.
+        :param published_after: If given, only return papers published after this time.
+        :param limit: Maximum number of papers to return (None for no limit).
+        :return: List of Paper objects.
+        """
+        sql = ("SELECT p.id, p.updated, p.published, p.title, p.summary, p.authors, p.paper_link, p.paper_pdf_link "
+               "FROM papers p JOIN query_papers q ON q.arxiv_id = p.arxiv_id WHERE q.query = ?")
+        params = [query]
+        if published_after is not None:
+            sql += " AND p.published >= ?"
+            params.append(published_after.isoformat())
+        sql += " ORDER BY p.updated DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._get_papers(sql, params)
+
+    def get_all_papers(self)->list[Paper]:
+        """
+        Get all the stored papers, most recently updated first.
+        :return: List of Paper objects.
+        """
+        return self._get_papers(
+            "SELECT id, updated, published, title, summary, authors, paper_link, paper_pdf_link "
+            "FROM papers ORDER BY updated DESC", []
+        )
+
+    def _get_papers(self, sql: str, params: list)->list[Paper]:
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [Paper(
+            id=row[0],
+            updated=datetime.fromisoformat(row[1]),
+            published=datetime.fromisoformat(row[2]),
+            title=row[3],
+            summary=row[4],
+            authors=[sys.intern(author) for author in json.loads(row[5])],
+            paper_link=row[6],
+            paper_pdf_link=row[7],
+        ) for row in rows]
+
+    def get_ratings(self, paper_ids: list[str])->dict[str, str]:
+        """
+        Get the stored ratings of the given papers.
+        Ratings are stored per arXiv id and version, so a new version of a paper is treated as unrated.
+        :param paper_ids: Ids of the papers (as in Paper.id).
+        :return: Dictionary mapping the ids of the papers that have a stored rating to the rating (serialized as JSON).
+        """
+        ratings = {}
+        with self._lock:
+            for paper_id in paper_ids:
+                row = self._connection.execute(
+                    "SELECT rating FROM ratings WHERE arxiv_id = ? AND version = ?", split_arxiv_id(paper_id)
+                ).fetchone()
+                if row is not None:
+                    ratings[paper_id] = row[0]
+        return ratings
+
+    def add_ratings(self, ratings: dict[str, str])->None:
+        """
+        Store ratings of papers.
+        :param ratings: Dictionary mapping ids of the papers (as in Paper.id) to their rating (serialized as JSON).
+        """
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO ratings (arxiv_id, version, rating) VALUES (?, ?, ?)",
+                [(*split_arxiv_id(paper_id), rating) for paper_id, rating in ratings.items()],
+            )
+            self._connection.commit()
+
+
+_paper_index = None
+_paper_index_lock = threading.Lock()
+
+def get_paper_index()->PaperIndex:
+    """
+    Get the process-wide paper index stored at the path configured in the ini file.
+    :return: The paper index.
+    """
+    global _paper_index
+    with _paper_index_lock:
+        if _paper_index is None:
+            _paper_index = PaperIndex(get_paper_index_path())
+    return _paper_index
+
+@dataclass
+class HarvestProgress:
+    """Outcome of paging through the results of a single search."""
+    harvested: int = 0
+    pages: int = 0
+    newest: Optional[datetime] = None
+    oldest: Optional[datetime] = None
+    complete: bool = False
+
+def _harvest_pages(query: str, search_query: str, since: Optional[datetime], max_pages: int)->HarvestProgress:
+    """
+    Page through the results of a search from the most recently updated one, storing them in the index,
+    until reaching papers updated before `since` or the end of the results.
+    :param query: Query the papers are stored for.
+    :param search_query: Text to search for (the query, possibly restricted to a range of update times).
+    :param since: Only papers updated at or after this time are stored (all of them if None).
+    :param max_pages: Maximum number of pages of `harvest_page_size` results to request.
+    :return: Number of stored papers and requested pages, newest and oldest `updated` timestamps of the stored papers,
+        and whether all the papers since `since` were reached (false if the page limit was hit first).
+    """
+    paper_index = get_paper_index()
+    page_size = get_harvest_page_size()
+    progress = HarvestProgress()
+
+    for page in range(max_pages):
+        papers = get_papers(search_query, page_size, page * page_size, True, sort_by="lastUpdatedDate")
+        progress.pages += 1
+        new_papers = [x for x in papers if since is None or x.updated >= since]
+        if new_papers:
+            paper_index.add_papers(query, new_papers)
+            progress.harvested += len(new_papers)
+            newest = max(x.updated for x in new_papers)
+            oldest = min(x.updated for x in new_papers)
+            progress.newest = newest if progress.newest is None else max(progress.newest, newest)
+            progress.oldest = oldest if progress.oldest is None else min(progress.oldest, oldest)
+        # Results are sorted by update time, so anything past `since` was already harvested
+        if len(new_papers) < len(papers) or len(papers) < page_size:
+            progress.complete = True
+            break
+    return progress
+
+def harvest_papers(query: str)->int:
+    """
+    Download papers published during the last month matching the query which weren't harvested before.
+    Results are paged through from the most recently updated one, stopping at the query's high-water mark
+    (or after `harvest_max_pages` pages of `harvest_page_size` results).
+    The high-water mark moves to the newest paper seen. If the page limit is hit before reaching the old mark,
+    the papers in between are recorded as a backfill range, which later runs page through with the pages left over.
+    A first harvest has nothing to backfill, as there's nothing older it has to catch up with.
+    :param query: Text to search for.
+    :return: Number of new or updated papers stored in the index.
+    """
+    paper_index = get_paper_index()
+    high_water_mark = paper_index.get_high_water_mark(query)
+    backfill_range = paper_index.get_backfill_range(query)
+    max_pages = get_harvest_max_pages()
+
+    progress = _harvest_pages(query, query, high_water_mark, max_pages)
+    harvested = progress.harvested
+    if not progress.complete and high_water_mark is not None:
+        # A range that is still being backfilled is extended, rather than tracking several ranges
+        oldest = high_water_mark if backfill_range is None else backfill_range[0]
+        backfill_range = (oldest, progress.oldest)
+    elif backfill_range is not None and progress.pages < max_pages:
+        oldest, newest = backfill_range
+        # The API filters by the minute, so the upper bound is rounded up to include the newest paper
+        time_filter = f"lastUpdatedDate:[{datetime_to_arxiv_str(oldest)}+TO+" \
+                      f"{datetime_to_arxiv_str(newest + timedelta(minutes=1))}]"
+        backfill = _harvest_pages(query, f"{query}+AND+{time_filter}", oldest, max_pages - progress.pages)
+        harvested += backfill.harvested
+        backfill_range = None if backfill.complete else (oldest, backfill.oldest)
+    paper_index.set_backfill_range(query, backfill_range)
+
+    if progress.newest is not None and (high_water_mark is None or progress.newest > high_water_mark):
+        paper_index.set_high_water_mark(query, progress.newest)
+    return harvested
+
+def get_recent_papers(query: str, limit: Optional[int] = None)->list[Paper]:
+    """
+    Harvest new papers matching the query and return the ones published during the last month from the local index.
+    :param query: Text to search for.
+    :param limit: Maximum number of papers to return (most recently updated first), None for no limit.
+    :return: List of Paper objects.
+    """
+    harvest_papers(query)
+    published_after = datetime.now(timezone.utc) - timedelta(days=30)
+    return get_paper_index().get_papers(query, published_after, limit)
\ No newline at end of file
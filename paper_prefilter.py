@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+import zlib
+from typing import Sequence, Optional
+
+import numpy as np
+from arxiv_api_client import Paper
+from paper_scoring import get_top_indices
+from parse_config import get_cache_path, get_prefilter_vector_size, get_prefilter_max_papers
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "has", "have", "in", "is", "it", "its",
+    "of", "on", "or", "our", "that", "the", "their", "this", "to", "we", "which", "with", "these", "such", "also",
+    "using", "based", "paper", "propose", "proposed", "show", "results", "approach", "method", "methods", "new",
+))
+
+
+def get_terms(text: str)->list[str]:
+    """
+    Split the text into terms (lowercase words without stop words, and pairs of consecutive words).
+    :param text: Text to split.
+    :return: List of terms.
+    """
+    words = [x for x in TOKEN_PATTERN.findall(text.lower()) if x not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+def vectorize(texts: Sequence[str], vector_size: int)->np.ndarray:
+    """
+    Convert texts to term frequency vectors, using the hashing trick to map terms to a fixed number of dimensions
+    (so the vectors of already indexed papers never have to be recomputed when new terms appear).
+    :param texts: Texts to convert.
+    :param vector_size: Number of dimensions of the vectors.
+    :return: Array of shape (number of texts, vector_size) with log-scaled term frequencies.
+    """
+    vectors = np.zeros((len(texts), vector_size), dtype=np.float32)
+    for row, text in enumerate(texts):
+        buckets = [zlib.crc32(term.encode("utf-8")) % vector_size for term in get_terms(text)]
+        np.add.at(vectors[row], buckets, 1)
+    return np.log1p(vectors)
+
+def normalize_rows(matrix: np.ndarray)->np.ndarray:
+    """
+    Scale each row of the matrix to unit length (rows of zeros are left as they are).
+    :param matrix: Matrix to normalize.
+    :return: Normalized matrix.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class PaperVectorIndex:
+    """
+    Term vectors of the abstracts of all papers seen so far, persisted between runs,
+    together with the document frequencies used for TF-IDF weighting.
+    """
+
+    def __init__(self, path: str, vector_size: int, max_papers: int):
+        """
+        :param path: Path of the .npz file the index is stored in (loaded if it exists).
+        :param vector_size: Number of dimensions of the vectors.
+        :param max_papers: Maximum number of papers kept in the index (the oldest ones are dropped first).
+        """
+        self.path = path
+        self.vector_size = vector_size
+        self.max_papers = max_papers
+        self.ids: list[str] = []
+        self.vectors = np.zeros((0, vector_size), dtype=np.float16)
+        self.document_frequencies = np.zeros(vector_size, dtype=np.int64)
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                if data["vectors"].shape[1] == vector_size:
+                    self.ids = data["ids"].tolist()
+                    self.vectors = data["vectors"]
+                    self.document_frequencies = data["document_frequencies"]
+        self._rows = {paper_id: row for row, paper_id in enumerate(self.ids)}
+
+    def add_papers(self, papers: Sequence[Paper])->None:
+        """
+        Vectorize the abstracts of papers that aren't in the index yet and add them to it,
+        then drop the oldest papers (other than the given ones) beyond `max_papers`.
+        :param papers: Papers to add.
+        """
+        new_papers = [x for x in papers if x.id not in self._rows]
+        if new_papers:
+            new_vectors = vectorize([f"{x.title} {x.summary}" for x in new_papers], self.vector_size)
+            self.document_frequencies += np.count_nonzero(new_vectors, axis=0)
+            # Vectors are stored in half precision to keep the index small - log-scaled counts don't need more
+            self.vectors = np.concatenate([self.vectors, new_vectors.astype(np.float16)])
+            for paper in new_papers:
+                self._rows[paper.id] = len(self.ids)
+                self.ids.append(paper.id)
+        self._drop_oldest({x.id for x in papers})
+
+    def _drop_oldest(self, kept_ids: set[str])->None:
+        """
+        Remove the oldest papers from the index until it has at most `max_papers` papers.
+        :param kept_ids: Ids of papers which must stay in the index (e.g. the ones about to be compared).
+        """
+        excess = len(self.ids) - self.max_papers
+        if excess <= 0:
+            return
+        dropped_rows = [row for row, paper_id in enumerate(self.ids) if paper_id not in kept_ids][:excess]
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[dropped_rows] = False
+        self.document_frequencies -= np.count_nonzero(self.vectors[~keep], axis=0)
+        self.vectors = self.vectors[keep]
+        self.ids = [paper_id for paper_id, is_kept in zip(self.ids, keep) if is_kept]
+        self._rows = {paper_id: row for row, paper_id in enumerate(self.ids)}
+
+    def save(self)->None:
+        """
+        Save the index to its file.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        np.savez(self.path, ids=np.array(self.ids, dtype=str), vectors=self.vectors,
+                 document_frequencies=self.document_frequencies)
+
+    def get_similarities(self, papers: Sequence[Paper], queries: Sequence[str])->np.ndarray:
+        """
+        Compute the TF-IDF cosine similarity of each paper (which must already be in the index) to each query.
+        :param papers: Papers to compare.
+        :param queries: Query texts (e.g. research interests).
+        :return: Array of shape (number of papers, number of queries).
+        """
+        idf = np.log((1 + len(self.ids)) / (1 + self.document_frequencies)).astype(np.float32) + 1
+        rows = np.fromiter((self._rows[x.id] for x in papers), dtype=np.intp, count=len(papers))
+        paper_vectors = normalize_rows(self.vectors[rows].astype(np.float32) * idf)
+        query_vectors = normalize_rows(vectorize(queries, self.vector_size) * idf)
+        return paper_vectors @ query_vectors.T
+
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+def get_vector_index()->PaperVectorIndex:
+    """
+    Get the process-wide paper vector index, stored in the cache directory.
+    :return: The vector index.
+    """
+    global _vector_index
+    with _vector_index_lock:
+        if _vector_index is None:
+            _vector_index = PaperVectorIndex(os.path.join(get_cache_path(), "paper_vectors.npz"),
+                                             get_prefilter_vector_size(), get_prefilter_max_papers())
+    return _vector_index
+
+def prefilter_papers(papers: Sequence[Paper], interests: Sequence[str], k: Optional[int])->list[Paper]:
+    """
+    Select the papers most similar to any of the research interests, using a local TF-IDF model,
+    so that only the most promising ones are rated by the LLM.
+    :param papers: Candidate papers.
+    :param interests: Research interests.
+    :param k: Number of papers to keep (all if None).
+    :return: The k papers with the highest similarity, most similar first.
+    """
+    if not papers:
+        return []
+    vector_index = get_vector_index()
+    vector_index.add_papers(papers)
+    vector_index.save()
+    scores = vector_index.get_similarities(papers, interests).max(axis=1)
+    return [papers[i] for i in get_top_indices(scores, k)]
\ No newline at end of file
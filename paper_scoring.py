@@ -0,0 +1,58 @@
+from typing import Sequence, Optional, TYPE_CHECKING
+
+import numpy as np
+from parse_config import get_rating_weights
+
+if TYPE_CHECKING:
+    from paper_filtering import PaperRating
+
+RATING_CRITERIA = ("novelty", "clarity", "impact")
+
+
+def get_rating_matrix(paper_ratings: Sequence["PaperRating"])->np.ndarray:
+    """
+    Collect the ratings of the papers into a matrix.
+    :param paper_ratings: Ratings of the papers.
+    :return: Array of shape (number of papers, number of criteria), with columns ordered as in RATING_CRITERIA.
+    """
+    matrix = np.empty((len(paper_ratings), len(RATING_CRITERIA)), dtype=np.float32)
+    for row, paper_rating in enumerate(paper_ratings):
+        matrix[row] = (paper_rating.novelty, paper_rating.clarity, paper_rating.impact)
+    return matrix
+
+def get_normalized_weights(weights: Optional[Sequence[float]] = None)->np.ndarray:
+    """
+    Get the weights of the rating criteria, normalized to sum to 1.
+    :param weights: Weights of novelty, clarity and impact (taken from the ini file if not given).
+    :return: Array of normalized weights.
+    """
+    if weights is None:
+        weights = get_rating_weights()
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.shape != (len(RATING_CRITERIA),) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError(f"Expected {len(RATING_CRITERIA)} non-negative rating weights with a positive sum, got {weights}")
+    return weights / weights.sum()
+
+def get_scores(paper_ratings: Sequence["PaperRating"], weights: Optional[Sequence[float]] = None)->np.ndarray:
+    """
+    Compute the weighted average rating of each paper.
+    :param paper_ratings: Ratings of the papers.
+    :param weights: Weights of novelty, clarity and impact (taken from the ini file if not given).
+    :return: Array with the score of each paper.
+    """
+    return get_rating_matrix(paper_ratings) @ get_normalized_weights(weights)
+
+def get_top_indices(scores: np.ndarray, n: Optional[int] = None)->np.ndarray:
+    """
+    Get the indices of the n highest scores, in descending order of the score.
+    Uses a partial sort, so only the selected n scores are fully sorted.
+    :param scores: Array of scores.
+    :param n: Number of indices to return (all if None).
+    :return: Array of indices.
+    """
+    if n is None or n >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+    top_indices = np.argpartition(-scores, n - 1)[:n]
+    return top_indices[np.argsort(-scores[top_indices], kind="stable")]
\ No newline at end of file
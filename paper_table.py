@@ -0,0 +1,69 @@
+import sys
+from datetime import timezone
+from typing import Sequence
+
+import numpy as np
+from arxiv_api_client import Paper
+from paper_index import get_paper_index
+
+# Timestamps are stored as UTC seconds since the epoch
+_EPOCH = np.datetime64(0, "s")
+
+
+def save_papers(papers: Sequence[Paper], path: str)->None:
+    """
+    Save papers to a columnar .npz file (one array per field).
+    Authors are stored as a single flat array of names, with offsets marking where each paper's authors start.
+    :param papers: Papers to save.
+    :param path: Path of the output file.
+    """
+    author_counts = np.fromiter((len(x.authors) for x in papers), dtype=np.int64, count=len(papers))
+    author_offsets = np.zeros(len(papers) + 1, dtype=np.int64)
+    np.cumsum(author_counts, out=author_offsets[1:])
+    np.savez_compressed(
+        path,
+        id=np.array([x.id for x in papers], dtype=str),
+        updated=np.array([int(x.updated.timestamp()) for x in papers], dtype=np.int64),
+        published=np.array([int(x.published.timestamp()) for x in papers], dtype=np.int64),
+        title=np.array([x.title or "" for x in papers], dtype=str),
+        summary=np.array([x.summary or "" for x in papers], dtype=str),
+        author_names=np.array([author for x in papers for author in x.authors], dtype=str),
+        author_offsets=author_offsets,
+        paper_link=np.array([x.paper_link or "" for x in papers], dtype=str),
+        paper_pdf_link=np.array([x.paper_pdf_link or "" for x in papers], dtype=str),
+    )
+
+def load_papers(path: str)->list[Paper]:
+    """
+    Load papers saved with save_papers.
+    :param path: Path of the .npz file.
+    :return: List of Paper objects.
+    """
+    with np.load(path, allow_pickle=False) as table:
+        ids = table["id"].tolist()
+        updated = (_EPOCH + table["updated"].astype("timedelta64[s]")).astype(object)
+        published = (_EPOCH + table["published"].astype("timedelta64[s]")).astype(object)
+        titles = table["title"].tolist()
+        summaries = table["summary"].tolist()
+        author_names = [sys.intern(x) for x in table["author_names"].tolist()]
+        author_offsets = table["author_offsets"].tolist()
+        paper_links = table["paper_link"].tolist()
+        paper_pdf_links = table["paper_pdf_link"].tolist()
+
+    return [Paper(
+        id=ids[i],
+        updated=updated[i].replace(tzinfo=timezone.utc),
+        published=published[i].replace(tzinfo=timezone.utc),
+        title=titles[i],
+        summary=summaries[i],
+        authors=author_names[author_offsets[i]:author_offsets[i + 1]],
+        paper_link=paper_links[i] or None,
+        paper_pdf_link=paper_pdf_links[i] or None,
+    ) for i in range(len(ids))]
+
+def export_paper_index(path: str)->None:
+    """
+    Save all papers from the local paper index to a columnar .npz file.
+    :param path: Path of the output file.
+    """
+    save_papers(get_paper_index().get_all_papers(), path)
\ No newline at end of file
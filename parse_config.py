@@ -1,16 +1,78 @@
 import configparser
+import os
+import threading
 from typing import List
 
+CONFIG_PATH = 'config.ini'
 
-def get_config():
-    config = configparser.ConfigParser()
-    config.read('config.ini')
-    return config
+_config = None
+_config_lock = threading.Lock()
+# Config being validated by the current thread, returned by get_config() until it's validated and published
+_validation_state = threading.local()
+
+
+def get_config()->configparser.ConfigParser:
+    """
+    Get the parsed ini file. The file is read and validated only once per process.
+    :return: The parsed config.
+    """
+    global _config
+    if _config is None:
+        pending_config = getattr(_validation_state, "config", None)
+        if pending_config is not None:
+            return pending_config
+        with _config_lock:
+            if _config is None:
+                config = configparser.ConfigParser()
+                config.read(CONFIG_PATH)
+                validate_config(config)
+                _config = config
+    return _config
+
+def reload_config()->None:
+    """
+    Discard the parsed config, so that the ini file is read again on next use.
+    """
+    global _config
+    with _config_lock:
+        _config = None
+
+def validate_config(config: configparser.ConfigParser)->None:
+    """
+    Read every config entry once (with the getters in CONFIG_GETTERS), so that missing entries or values
+    of the wrong type are reported when the config is loaded instead of in the middle of a run.
+    :param config: Parsed config to validate.
+    """
+    _validation_state.config = config
+    try:
+        for getter in CONFIG_GETTERS:
+            try:
+                getter()
+            except (KeyError, ValueError, configparser.Error) as e:
+                raise ValueError(f"Invalid entry in {CONFIG_PATH} (read by {getter.__name__}): {e!r}") from e
+    finally:
+        _validation_state.config = None
 
 def get_api_key()->str:
     config = get_config()
     return config['gemini']['api_key']
 
+def get_requests_per_minute()->float:
+    config = get_config()
+    return config.getfloat('gemini', 'requests_per_minute', fallback=10)
+
+def get_rating_batch_tokens()->int:
+    config = get_config()
+    return config.getint('gemini', 'rating_batch_tokens', fallback=8000)
+
+def get_rating_workers()->int:
+    config = get_config()
+    return max(config.getint('gemini', 'rating_workers', fallback=4), 1)
+
+def get_rating_retries()->int:
+    config = get_config()
+    return config.getint('gemini', 'rating_retries', fallback=2)
+
 def get_interests()->List[str]:
     config = get_config()
     interests = config['topics']['research_interests']
@@ -18,6 +80,47 @@ def get_interests()->List[str]:
     interests = [interest.strip() for interest in interests]
     return interests
 
+def get_rating_weights()->List[float]:
+    config = get_config()
+    weights = config.get('topics', 'rating_weights', fallback='1, 1, 1')
+    return [float(weight) for weight in weights.split(',')]
+
+def get_papers_per_interest()->int:
+    config = get_config()
+    return config.getint('topics', 'papers_per_interest', fallback=200)
+
+def get_prefilter_enabled()->bool:
+    config = get_config()
+    return config.getboolean('prefilter', 'prefilter_enabled', fallback=True)
+
+def get_prefilter_top_k()->int:
+    config = get_config()
+    return config.getint('prefilter', 'papers_to_rate', fallback=100)
+
+def get_prefilter_vector_size()->int:
+    config = get_config()
+    return config.getint('prefilter', 'vector_size', fallback=2048)
+
+def get_prefilter_max_papers()->int:
+    config = get_config()
+    return max(config.getint('prefilter', 'max_indexed_papers', fallback=20000), 1)
+
+def get_harvest_page_size()->int:
+    config = get_config()
+    return config.getint('arxiv', 'harvest_page_size', fallback=100)
+
+def get_harvest_max_pages()->int:
+    config = get_config()
+    return config.getint('arxiv', 'harvest_max_pages', fallback=5)
+
+def get_tool_cache_ttl_minutes()->float:
+    config = get_config()
+    return config.getfloat('arxiv', 'tool_cache_ttl_minutes', fallback=60)
+
+def get_tool_cache_max_entries()->int:
+    config = get_config()
+    return config.getint('arxiv', 'tool_cache_max_entries', fallback=256)
+
 def get_tesseract_path()->str:
     config = get_config()
     return config['tesseract']['tesseract_path']
@@ -26,10 +129,109 @@ def get_use_tesseract()->bool:
     config = get_config()
     return config.getboolean('tesseract', 'use_tesseract')
 
+def get_ocr_workers()->int:
+    config = get_config()
+    workers = config.getint('tesseract', 'ocr_workers', fallback=0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def get_ocr_page_width()->int:
+    config = get_config()
+    return config.getint('tesseract', 'ocr_page_width', fallback=2480)
+
+def get_ocr_max_buffered_pages()->int:
+    config = get_config()
+    max_buffered_pages = config.getint('tesseract', 'ocr_max_buffered_pages', fallback=0)
+    if max_buffered_pages <= 0:
+        max_buffered_pages = 2 * get_ocr_workers()
+    return max_buffered_pages
+
 def get_papers_path()->str:
     config = get_config()
     return config['filepaths']['papers_path']
 
 def get_reports_path()->str:
     config = get_config()
-    return config['filepaths']['reports_path']
\ No newline at end of file
+    return config['filepaths']['reports_path']
+
+def get_paper_index_path()->str:
+    config = get_config()
+    return config.get('filepaths', 'paper_index_path', fallback='paper_index.sqlite')
+
+def get_cache_path()->str:
+    config = get_config()
+    return config.get('cache', 'cache_path', fallback='cache')
+
+def get_text_cache_max_mb()->int:
+    config = get_config()
+    return config.getint('cache', 'text_cache_max_mb', fallback=200)
+
+def get_llm_cache_enabled()->bool:
+    config = get_config()
+    return config.getboolean('cache', 'llm_cache_enabled', fallback=True)
+
+def get_llm_cache_ttl_hours()->float:
+    config = get_config()
+    return config.getfloat('cache', 'llm_cache_ttl_hours', fallback=168)
+
+def get_llm_cache_max_entries()->int:
+    config = get_config()
+    return config.getint('cache', 'llm_cache_max_entries', fallback=5000)
+
+def get_extraction_workers()->int:
+    config = get_config()
+    return max(config.getint('batch', 'extraction_workers', fallback=2), 1)
+
+def get_llm_workers()->int:
+    config = get_config()
+    return max(config.getint('batch', 'llm_workers', fallback=4), 1)
+
+def get_map_reduce_threshold_tokens()->int:
+    config = get_config()
+    return config.getint('summarization', 'map_reduce_threshold_tokens', fallback=60000)
+
+def get_map_reduce_chunk_tokens()->int:
+    config = get_config()
+    return config.getint('summarization', 'map_reduce_chunk_tokens', fallback=15000)
+
+def get_map_reduce_workers()->int:
+    config = get_config()
+    return max(config.getint('summarization', 'map_reduce_workers', fallback=4), 1)
+
+def get_min_page_quality()->float:
+    config = get_config()
+    return config.getfloat('text_quality', 'min_page_quality', fallback=0.6)
+
+def get_per_page_extraction()->bool:
+    config = get_config()
+    return config.getboolean('text_quality', 'per_page_extraction', fallback=True)
+
+def get_selective_cleanup()->bool:
+    config = get_config()
+    return config.getboolean('text_quality', 'selective_cleanup', fallback=True)
+
+def get_run_reports_enabled()->bool:
+    config = get_config()
+    return config.getboolean('instrumentation', 'run_reports', fallback=True)
+
+def get_run_reports_path()->str:
+    config = get_config()
+    return config.get('instrumentation', 'run_reports_path', fallback=os.path.join('cache', 'runs'))
+
+def get_profile_enabled()->bool:
+    config = get_config()
+    return config.getboolean('instrumentation', 'profile', fallback=False)
+
+# Getters of all the config entries, read by validate_config (new getters have to be added here)
+CONFIG_GETTERS = (
+    get_api_key, get_requests_per_minute, get_rating_batch_tokens, get_rating_workers, get_rating_retries,
+    get_interests, get_rating_weights, get_papers_per_interest, get_prefilter_enabled, get_prefilter_top_k,
+    get_prefilter_vector_size, get_prefilter_max_papers, get_harvest_page_size, get_harvest_max_pages,
+    get_tool_cache_ttl_minutes, get_tool_cache_max_entries, get_tesseract_path, get_use_tesseract, get_ocr_workers,
+    get_ocr_page_width, get_ocr_max_buffered_pages, get_papers_path, get_reports_path, get_paper_index_path,
+    get_cache_path, get_text_cache_max_mb, get_llm_cache_enabled, get_llm_cache_ttl_hours, get_llm_cache_max_entries,
+    get_extraction_workers, get_llm_workers, get_map_reduce_threshold_tokens, get_map_reduce_chunk_tokens,
+    get_map_reduce_workers, get_min_page_quality, get_per_page_extraction, get_selective_cleanup,
+    get_run_reports_enabled, get_run_reports_path, get_profile_enabled,
+)
\ No newline at end of file
@@ -1,58 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional, TYPE_CHECKING
 
-from text_cleaning import cleanup_article
-from pdf_text_extraction import get_pdf_text
+from instrumentation import timed_stage, instrumented_run, format_stage_summary
+from text_cache import get_cleaned_text, get_extracted_text, get_file_hash, is_cleaned_text_cached
+from pdf_text_extraction import shared_ocr_pool
+from text_cleaning import is_long_text, split_text
 from model import get_llm
 from langchain_core.prompts import PromptTemplate
-from parse_config import get_reports_path, get_papers_path
+from parse_config import get_reports_path, get_papers_path, get_extraction_workers, get_llm_workers, \
+    get_map_reduce_chunk_tokens, get_map_reduce_workers
 import os
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
 summarize_prompt = PromptTemplate.from_template("Summarize the following arXiv article to 500 words or less: \n\n {article}")
 plain_english_prompt = PromptTemplate.from_template("Based on the following summary of an arXiv article, "
                                              "write a simplified explanation that could be understandable to "
                                              "an undergraduate student not acquainted well with this field: \n\n {article_summary}")
+summarize_part_prompt = PromptTemplate.from_template("Summarize the following part of an arXiv article to 300 words or less, "
+                                                    "keeping the key ideas, methods and results: \n\n {article_part}")
+combine_summaries_prompt = PromptTemplate.from_template("The following are summaries of consecutive parts of an arXiv article. "
+                                                        "Combine them into a single summary of the article of 500 words or less: "
+                                                        "\n\n {part_summaries}")
 pros_cons_prompt = PromptTemplate.from_template("Based on the following summary of an arXiv article, "
                                                 "write a list of positive and negative aspects of what was presented. "
                                                 "Mention potential applications, impact, as well as drawbacks or aspects "
                                                 "that might negatively influence wider application of what was presented (if applicable)."
                                                 "Article: \n\n {article_summary}")
 
-papers_path = get_papers_path()
-reports_path = get_reports_path()
-
-def summarize_article(article_text: str)->str:
+def summarize_article(article_text: str, llm: Optional["BaseChatModel"] = None)->str:
     """
     Use an LLM to generate a summary of the article.
+    Long articles are summarized with map-reduce: chunks (`map_reduce_chunk_tokens`) are summarized concurrently,
+    and the summaries of the chunks are then combined into a single summary.
     :param article_text: Text of the article (extracted from a PDF).
+    :param llm: LLM to use (a new one is created if not given).
     :return: Summary of the article.
     """
-    llm = get_llm()
-    prompt = summarize_prompt.format(article=article_text)
-    result = llm.invoke(prompt)
+    if llm is None:
+        llm = get_llm()
+    if is_long_text(article_text):
+        chunks = split_text(article_text, get_map_reduce_chunk_tokens())
+        with ThreadPoolExecutor(max_workers=get_map_reduce_workers()) as executor:
+            part_summaries = list(executor.map(lambda chunk: summarize_article_part(chunk, llm), chunks))
+        prompt = combine_summaries_prompt.format(part_summaries="\n\n---\n\n".join(part_summaries))
+    else:
+        prompt = summarize_prompt.format(article=article_text)
+    with timed_stage("summary llm") as stats:
+        stats.bytes_processed = len(prompt.encode("utf-8"))
+        result = llm.invoke(prompt)
     result_text = result.content
     return result_text
 
-def explain_summary(article_summary: str)->str:
+def summarize_article_part(article_part: str, llm: "BaseChatModel")->str:
+    """
+    Use an LLM to generate a summary of a part of the article (the map step of map-reduce summarization).
+    :param article_part: Part of the text of the article.
+    :param llm: LLM to use.
+    :return: Summary of the part of the article.
+    """
+    prompt = summarize_part_prompt.format(article_part=article_part)
+    with timed_stage("summary part llm") as stats:
+        stats.bytes_processed = len(article_part.encode("utf-8"))
+        result = llm.invoke(prompt)
+    return result.content
+
+def explain_summary(article_summary: str, llm: Optional["BaseChatModel"] = None)->str:
     """
     Use an LLM to generate a simplified explanation of the article.
     :param article_summary: Summary of the article.
+    :param llm: LLM to use (a new one is created if not given).
     :return: A simplified explanation of the article.
     """
-    llm = get_llm()
+    if llm is None:
+        llm = get_llm()
     prompt = plain_english_prompt.format(article_summary=article_summary)
-    result = llm.invoke(prompt)
+    with timed_stage("explanation llm"):
+        result = llm.invoke(prompt)
     result_text = result.content
     return result_text
 
-def explain_summary_pros_cons(article_summary: str)->str:
+def explain_summary_pros_cons(article_summary: str, llm: Optional["BaseChatModel"] = None)->str:
     """
     Use an LLM to generate comments about the potential applications, as well as drawbacks of what was presented in the article.
     :param article_summary: Summary of the article.
+    :param llm: LLM to use (a new one is created if not given).
     :return: Commentary about the potential applications, as well as drawbacks of what was presented in the article.
     """
-    llm = get_llm()
+    if llm is None:
+        llm = get_llm()
     prompt = pros_cons_prompt.format(article_summary=article_summary)
-    result = llm.invoke(prompt)
+    with timed_stage("pros/cons llm"):
+        result = llm.invoke(prompt)
     result_text = result.content
     return result_text
 
@@ -75,33 +116,130 @@ def assemble_report(article_id: str, article_summary: str, article_explanation:
     markdown_report += pros_cons
     return markdown_report
 
+def get_report_path(filename: str)->Path:
+    """
+    Get the path of the markdown report of the article.
+    :param filename: Filename of the article (relative to the papers directory).
+    :return: Path of the report.
+    """
+    return Path(os.path.join(get_reports_path(), filename)).with_suffix(".md")
+
 def save_report(report_markdown: str, filename: str)->None:
     """
     Save a markdown report of the article.
     :param report_markdown: Markdown report of the article.
     :param filename: Filename of the output file (not full path).
     """
-    file_path_pdf = os.path.join(reports_path, filename)
-    file_path_markdown = Path(file_path_pdf).with_suffix(".md")
+    file_path_markdown = get_report_path(filename)
+    file_path_markdown.parent.mkdir(parents=True, exist_ok=True)
     with open(file_path_markdown, "w", encoding="utf-8", errors="ignore") as f:
         f.write(report_markdown)
 
+def is_report_up_to_date(article_filename: str)->bool:
+    """
+    Check whether a report of the article exists and is newer than the article itself.
+    :param article_filename: Filename of the article (relative to the papers directory).
+    :return: True if the report doesn't need to be regenerated.
+    """
+    report_path = get_report_path(article_filename)
+    article_path = os.path.join(get_papers_path(), article_filename)
+    return report_path.exists() and report_path.stat().st_mtime >= os.path.getmtime(article_path)
+
+def find_papers()->list[str]:
+    """
+    Find all PDF files in the papers directory (including subdirectories).
+    :return: Filenames of the PDFs, relative to the papers directory.
+    """
+    papers_dir = Path(get_papers_path())
+    return sorted(str(path.relative_to(papers_dir)) for path in papers_dir.rglob("*.pdf"))
+
+
+def _extract_paper_text(article_filename: str)->str:
+    """
+    Extract (and cache) the text of the article, so that the report generation can start from the cached text.
+    Nothing is extracted if the cleaned text of the article is already cached.
+    :param article_filename: Filename of the article (relative to the papers directory).
+    :return: Hash of the article file.
+    """
+    article_path = os.path.join(get_papers_path(), article_filename)
+    with timed_stage("extraction"):
+        pdf_hash = get_file_hash(article_path)
+        if not is_cleaned_text_cached(pdf_hash):
+            get_extracted_text(article_path, pdf_hash)
+    return pdf_hash
+
+def _generate_report(article_filename: str, llm: "BaseChatModel", pdf_hash: Optional[str] = None)->None:
+    """
+    Run the LLM stages of the report generation and save the report.
+    The simplified explanation and the pros / cons commentary only depend on the summary, so they are generated concurrently.
+    :param article_filename: Filename of the article (relative to the papers directory).
+    :param llm: LLM to use.
+    :param pdf_hash: Hash of the article file (computed if not given).
+    """
+    article_path = os.path.join(get_papers_path(), article_filename)
+
+    with timed_stage("cleanup"):
+        cleaned_text = get_cleaned_text(article_path, llm, pdf_hash)
+    with timed_stage("summary"):
+        article_summary = summarize_article(cleaned_text, llm)
+    with timed_stage("explanation + pros/cons"), ThreadPoolExecutor(max_workers=2) as executor:
+        explanation_future = executor.submit(explain_summary, article_summary, llm)
+        pros_cons_future = executor.submit(explain_summary_pros_cons, article_summary, llm)
+        article_explanation = explanation_future.result()
+        pros_cons = pros_cons_future.result()
+
+    assembled_report = assemble_report(article_filename, article_summary, article_explanation, pros_cons)
+    save_report(assembled_report, article_filename)
 
 def generate_paper_summary(article_filename: str)->None:
     """
     Generate a markdown report of the given article.
     :param article_filename: Filename of the article (not full path).
     """
-    article_path = os.path.join(papers_path, article_filename)
+    with instrumented_run("summary"):
+        pdf_hash = _extract_paper_text(article_filename)
+        _generate_report(article_filename, get_llm(), pdf_hash)
 
-    extracted_text = get_pdf_text(article_path)
-    cleaned_text = cleanup_article(extracted_text)
-    article_summary = summarize_article(cleaned_text)
-    article_explanation = explain_summary(article_summary)
-    pros_cons = explain_summary_pros_cons(article_summary)
+def generate_paper_summaries(regenerate: bool = False)->None:
+    """
+    Generate markdown reports of all the articles in the papers directory.
+    Text extraction (CPU-bound) and the LLM stages (I/O-bound) run on separate bounded pools
+    (`extraction_workers` / `llm_workers` in the ini file), so the LLM calls for one article overlap with the
+    extraction of the next ones. LLM calls are throttled to the configured `requests_per_minute`.
+    :param regenerate: If true, also regenerate reports that are already up to date.
+    """
+    article_filenames = [x for x in find_papers() if regenerate or not is_report_up_to_date(x)]
+    print(f"Generating reports for {len(article_filenames)} article(s)")
+    with instrumented_run("summaries"):
+        llm = get_llm()
+        failed = []
 
-    assembled_report = assemble_report(article_filename, article_summary, article_explanation, pros_cons)
-    save_report(assembled_report, article_filename)
+        # All the extraction threads share a single pool of OCR processes
+        with shared_ocr_pool(), ThreadPoolExecutor(max_workers=get_extraction_workers()) as extraction_executor, \
+                ThreadPoolExecutor(max_workers=get_llm_workers()) as llm_executor:
+            extraction_futures = {extraction_executor.submit(_extract_paper_text, x): x for x in article_filenames}
+            report_futures = {}
+            for future in as_completed(extraction_futures):
+                article_filename = extraction_futures[future]
+                try:
+                    pdf_hash = future.result()
+                except Exception as e:
+                    print(f"Text extraction failed for {article_filename}: {e}")
+                    failed.append(article_filename)
+                    continue
+                report_futures[llm_executor.submit(_generate_report, article_filename, llm, pdf_hash)] = article_filename
+            for future in as_completed(report_futures):
+                article_filename = report_futures[future]
+                try:
+                    future.result()
+                    print(f"Generated report for {article_filename}")
+                except Exception as e:
+                    print(f"Report generation failed for {article_filename}: {e}")
+                    failed.append(article_filename)
+
+        print(format_stage_summary())
+    if failed:
+        print(f"Failed articles: {', '.join(failed)}")
 
 if __name__ == "__main__":
     generate_paper_summary("2510.14837v1.pdf")
\ No newline at end of file
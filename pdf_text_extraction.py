@@ -1,13 +1,40 @@
-from typing import Sequence
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from contextlib import contextmanager, nullcontext
+from typing import Sequence, Iterator, Optional, ContextManager, TYPE_CHECKING
 
-import pdfplumber
-import pytesseract
-from PIL.Image import Image
-from parse_config import get_tesseract_path, get_use_tesseract
+from parse_config import get_tesseract_path, get_use_tesseract, get_ocr_workers, get_ocr_page_width, \
+    get_ocr_max_buffered_pages, get_per_page_extraction, get_min_page_quality
+from instrumentation import timed_stage
+from text_quality import score_text_quality, is_clean_text
 
-use_tesseract = get_use_tesseract()
-if use_tesseract:
-    pytesseract.pytesseract.tesseract_cmd = get_tesseract_path()
+# pdfplumber and pytesseract are imported by the functions that use them, so that importing this module stays cheap
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
+PAGE_SEPARATOR = "\f"
+
+# PDF opened by the current OCR worker process, kept open so that consecutive pages don't re-parse the file
+_worker_pdf = None
+
+# OCR worker pool used by all extractions while shared_ocr_pool() is active (None otherwise)
+_shared_ocr_executor = None
+
+def iter_pdf_plumber(pdf_path: str)->Iterator[str]:
+    """
+    Extract text from pdf file using pdfplumber, one page at a time.
+    Each page is released after its text is extracted.
+    :param pdf_path: Path of the pdf file.
+    :return: Iterator over the extracted text of each page.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text()
+            page.close()
+            yield text
 
 def read_pdf_plumber(pdf_path: str)->str:
     """
@@ -15,45 +42,243 @@ def read_pdf_plumber(pdf_path: str)->str:
     :param pdf_path: Path of the pdf file.
     :return: Extracted text.
     """
-    text = ""
+    return "".join(iter_pdf_plumber(pdf_path))
+
+def iter_pdf_images(pdf_path: str)->Iterator["Image"]:
+    """
+    Extract pages from the pdf file as images using pdfplumber, rendering each page only when it is requested.
+    :param pdf_path: Path of the pdf file.
+    :return: Iterator over the page images.
+    """
+    import pdfplumber
+
+    width = get_ocr_page_width()
     with pdfplumber.open(pdf_path) as pdf:
         for page in pdf.pages:
-            text += page.extract_text()
-    return text
+            image = page.to_image(width=width).original
+            page.close()
+            yield image
 
-def pdf_to_images(pdf_path: str)->Sequence[Image]:
+def pdf_to_images(pdf_path: str)->Sequence["Image"]:
     """
     Extract pages from the pdf file as images using pdfplumber.
     :param pdf_path: Path of the pdf file.
     :return: Extracted images.
     """
-    images = []
+    return list(iter_pdf_images(pdf_path))
+
+def get_page_count(pdf_path: str)->int:
+    """
+    Get the number of pages in the pdf file.
+    :param pdf_path: Path of the pdf file.
+    :return: Number of pages.
+    """
+    import pdfplumber
+
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            images.append(page.to_image(width=2480).original)
-    return images
+        return len(pdf.pages)
+
+def _init_ocr_worker(tesseract_cmd: str)->None:
+    """
+    Initialize an OCR worker process.
+    :param tesseract_cmd: Path of the tesseract executable.
+    """
+    import pytesseract
+
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+def _get_cpu_time()->float:
+    """
+    Get the CPU time used by the current process and its finished child processes (e.g. tesseract).
+    :return: CPU time in seconds.
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def _ocr_page(pdf_path: str, page_number: int, width: int)->tuple[str, float]:
+    """
+    Render a single page of the pdf file and extract its text using Tesseract OCR.
+    Runs inside an OCR worker process.
+    :param pdf_path: Path of the pdf file.
+    :param page_number: Index of the page (0-based).
+    :param width: Width (in pixels) the page is rendered at.
+    :return: Extracted text of the page, and the CPU time (in seconds) it took to extract it.
+    """
+    import pdfplumber
+    import pytesseract
+
+    global _worker_pdf
+    cpu_start = _get_cpu_time()
+    if _worker_pdf is None or _worker_pdf[0] != pdf_path:
+        if _worker_pdf is not None:
+            _worker_pdf[1].close()
+        _worker_pdf = (pdf_path, pdfplumber.open(pdf_path))
+    page = _worker_pdf[1].pages[page_number]
+    image = page.to_image(width=width).original
+    text = pytesseract.image_to_string(image)
+    page.close()
+    return text, _get_cpu_time() - cpu_start
+
+def _get_ocr_result(ocr_future: Future)->str:
+    """
+    Wait for the OCR of a page to finish, recording it in the "ocr" stage.
+    :param ocr_future: Future of the result of _ocr_page.
+    :return: Extracted text of the page.
+    """
+    with timed_stage("ocr") as stats:
+        text, cpu_time = ocr_future.result()
+        stats.pages = 1
+        stats.cpu_time += cpu_time
+    return text
+
+def _create_ocr_executor(workers: int)->ProcessPoolExecutor:
+    """
+    Create a pool of OCR worker processes.
+    :param workers: Number of worker processes.
+    :return: The pool.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker, initargs=(get_tesseract_path(),))
+
+def _get_ocr_executor(workers: int)->ContextManager[ProcessPoolExecutor]:
+    """
+    Get the pool to OCR a document with: the shared one if shared_ocr_pool() is active, otherwise a new one.
+    :param workers: Number of worker processes of a new pool.
+    :return: Context manager of the pool (only a new pool is shut down on exit).
+    """
+    if _shared_ocr_executor is not None:
+        return nullcontext(_shared_ocr_executor)
+    return _create_ocr_executor(workers)
+
+@contextmanager
+def shared_ocr_pool()->Iterator[None]:
+    """
+    OCR all documents extracted inside the block (also from multiple threads) with a single pool of `ocr_workers`
+    processes, instead of a separate pool per document, which would run `ocr_workers` processes for each
+    document being extracted at the same time.
+    """
+    global _shared_ocr_executor
+    if not get_use_tesseract():
+        yield
+        return
+    with _create_ocr_executor(get_ocr_workers()) as executor:
+        _shared_ocr_executor = executor
+        try:
+            yield
+        finally:
+            _shared_ocr_executor = None
+
+def iter_pdf_tesseract(pdf_path: str)->Iterator[str]:
+    """
+    Extract text from pdf file using a pdfplumber --> tesseract pipeline, one page at a time.
+    Pages are rendered and OCR'd by a pool of worker processes (`ocr_workers` in the ini file), but at most
+    `ocr_max_buffered_pages` pages are in flight at once, so memory use doesn't grow with the length of the document.
+    :param pdf_path: Path of the pdf file.
+    :return: Iterator over the extracted text of each page (in page order).
+    """
+    page_count = get_page_count(pdf_path)
+    workers = max(min(get_ocr_workers(), page_count), 1)
+    max_buffered_pages = max(get_ocr_max_buffered_pages(), workers)
+    width = get_ocr_page_width()
+    with _get_ocr_executor(workers) as executor:
+        pending = deque()
+        next_page = 0
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < max_buffered_pages:
+                pending.append(executor.submit(_ocr_page, pdf_path, next_page, width))
+                next_page += 1
+            yield _get_ocr_result(pending.popleft())
 
 # OCR from images appears to give better results than just extracting the text from the PDF due to layout issues
-def read_pdf_tesseract(pdf_path):
+def read_pdf_tesseract(pdf_path: str)->str:
     """
     Extract text from pdf file using a pdfplumber --> tesseract pipeline.
-    This first extracts pages as images from the file, and then extracts text from them using Tesseract OCR.
+    Pages are rendered to images and OCR'd concurrently by a pool of worker processes (`ocr_workers` in the ini file).
     :param pdf_path: Path of the pdf file.
     :return: Extracted text.
     """
-    images = pdf_to_images(pdf_path)
-    text = ""
-    for image in images:
-        text += pytesseract.image_to_string(image)
-    return text
+    return "".join(iter_pdf_tesseract(pdf_path))
+
+def iter_pdf_adaptive(pdf_path: str)->Iterator[str]:
+    """
+    Extract text from pdf file choosing the extraction method for each page separately.
+    Every page is first extracted with pdfplumber, which is fast and works well for born-digital PDFs.
+    Pages whose text scores below `min_page_quality` are also OCR'd with Tesseract (in the OCR worker pool,
+    at most `ocr_max_buffered_pages` at a time), and the better of the two texts is used.
+    :param pdf_path: Path of the pdf file.
+    :return: Iterator over the extracted text of each page (in page order).
+    """
+    import pdfplumber
+
+    workers = get_ocr_workers()
+    max_buffered_pages = max(get_ocr_max_buffered_pages(), workers)
+    width = get_ocr_page_width()
+    with _get_ocr_executor(workers) as executor, pdfplumber.open(pdf_path) as pdf:
+        # Pairs of (pdfplumber text, future of the OCR text or None if the pdfplumber text is good enough)
+        pending = deque()
+        for page_number, page in enumerate(pdf.pages):
+            text = page.extract_text()
+            page.close()
+            ocr_future = None
+            if not is_clean_text(text):
+                ocr_future = executor.submit(_ocr_page, pdf_path, page_number, width)
+            pending.append((text, ocr_future))
+            while pending and (pending[0][1] is None or len(pending) > max_buffered_pages):
+                yield _select_page_text(*pending.popleft())
+        while pending:
+            yield _select_page_text(*pending.popleft())
+
+def _select_page_text(plumber_text: str, ocr_future: Optional[Future])->str:
+    """
+    Choose between the pdfplumber and OCR text of a page based on their quality score.
+    :param plumber_text: Text extracted with pdfplumber.
+    :param ocr_future: Future of the text extracted with Tesseract OCR (None if the page wasn't OCR'd).
+    :return: Text of the page.
+    """
+    if ocr_future is None:
+        return plumber_text
+    ocr_text = _get_ocr_result(ocr_future)
+    if score_text_quality(ocr_text) > score_text_quality(plumber_text):
+        return ocr_text
+    return plumber_text
+
+def iter_pdf_text(pdf_path: str)->Iterator[str]:
+    """
+    Extract text from the pdf file page by page using the strategy configured in the ini file.
+    Pages are rendered and released as they are processed, so peak memory doesn't depend on the number of pages.
+    :param pdf_path: Path of the pdf file.
+    :return: Iterator over the extracted text of each page.
+    """
+    use_tesseract = get_use_tesseract()
+    if use_tesseract and get_per_page_extraction():
+        return iter_pdf_adaptive(pdf_path)
+    elif use_tesseract:
+        return iter_pdf_tesseract(pdf_path)
+    else:
+        return iter_pdf_plumber(pdf_path)
+
+def get_extraction_method()->str:
+    """
+    Get an identifier of the text extraction strategy configured in the ini file (used e.g. as part of cache keys).
+    :return: Identifier of the extraction strategy.
+    """
+    use_tesseract = get_use_tesseract()
+    if use_tesseract and get_per_page_extraction():
+        return f"adaptive-{get_ocr_page_width()}-{get_min_page_quality()}"
+    elif use_tesseract:
+        return f"tesseract-{get_ocr_page_width()}"
+    else:
+        return "pdfplumber"
 
 def get_pdf_text(pdf_path:str)->str:
     """
     Extract text from the pdf file using the strategy configured in the ini file.
+    Pages are separated with form feeds (PAGE_SEPARATOR).
     :param pdf_path: Path of the pdf file.
     :return: Extracted text.
     """
-    if use_tesseract:
-        return read_pdf_tesseract(pdf_path)
-    else:
-        return read_pdf_plumber(pdf_path)
\ No newline at end of file
+    with timed_stage("text extraction") as stats:
+        # Tesseract already ends each page with a form feed
+        pages = [page.rstrip(PAGE_SEPARATOR) for page in iter_pdf_text(pdf_path)]
+        stats.pages = len(pages)
+        stats.bytes_processed = os.path.getsize(pdf_path)
+    return PAGE_SEPARATOR.join(pages)
\ No newline at end of file
@@ -1,5 +1,4 @@
-from pdf_summarization import generate_paper_summary
-from paper_filtering import get_most_interesting_papers
+# The pipelines are imported when used, so that importing this module only pulls in what the called entry point needs
 
 def generate_article_report(article_filename: str)->None:
     """
@@ -8,13 +7,24 @@ def generate_article_report(article_filename: str)->None:
     and the report will be saved to the `reports_path` directory.
     :param article_filename: Filename (not full path) of the article.
     """
+    from pdf_summarization import generate_paper_summary
     generate_paper_summary(article_filename)
 
+def generate_article_reports(regenerate: bool = False)->None:
+    """
+    Generate markdown reports of all the articles in the `papers_path` directory configured in the ini file.
+    Articles which already have an up-to-date report in the `reports_path` directory are skipped.
+    :param regenerate: If true, also regenerate reports that are already up to date.
+    """
+    from pdf_summarization import generate_paper_summaries
+    generate_paper_summaries(regenerate)
+
 def get_interesting_papers(no_papers: int)->None:
     """
     Print information about most interesting papers from the domains configured in the ini file.
     :param no_papers: Number of most interesting papers to print information about.
     """
+    from paper_filtering import get_most_interesting_papers
     for x in get_most_interesting_papers(no_papers):
         print(x)
 
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional, TYPE_CHECKING
+
+from parse_config import get_cache_path, get_text_cache_max_mb
+from pdf_text_extraction import get_pdf_text, get_extraction_method
+from text_cleaning import cleanup_article, get_cleanup_prompt_version
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+
+def get_file_hash(file_path: str)->str:
+    """
+    Compute the SHA-256 hash of the file contents.
+    :param file_path: Path of the file.
+    :return: Hex digest of the file contents.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def get_text_cache_dir()->str:
+    """
+    Get the directory of the text cache, creating it if needed.
+    :return: Path of the text cache directory.
+    """
+    cache_dir = os.path.join(get_cache_path(), "text")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def load_cached_text(key: str)->Optional[str]:
+    """
+    Load a text entry from the cache.
+    :param key: Cache key of the entry.
+    :return: Cached text, or None if the entry isn't cached.
+    """
+    entry_path = os.path.join(get_text_cache_dir(), f"{key}.txt")
+    try:
+        with open(entry_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    # Modification time is used as the last access time for eviction
+    try:
+        os.utime(entry_path)
+    except FileNotFoundError:
+        pass
+    return text
+
+def store_cached_text(key: str, text: str)->None:
+    """
+    Save a text entry to the cache and evict the least recently used entries if the cache grew too large.
+    :param key: Cache key of the entry.
+    :param text: Text to cache.
+    """
+    cache_dir = get_text_cache_dir()
+    entry_path = os.path.join(cache_dir, f"{key}.txt")
+    # Unique temporary file, as other threads (or processes) may be storing the same entry at the same time
+    file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with open(file_descriptor, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, entry_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    evict_text_cache(get_text_cache_max_mb() * 1024 * 1024)
+
+def evict_text_cache(max_bytes: int)->None:
+    """
+    Remove the least recently used entries until the total size of the text cache is at most max_bytes.
+    :param max_bytes: Maximum total size of the cache in bytes.
+    """
+    cache_dir = get_text_cache_dir()
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".txt"):
+            # The entry may have been evicted by another thread in the meantime
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    entries.sort()
+    for _, size, path in entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+def get_extracted_text(pdf_path: str, pdf_hash: Optional[str] = None)->str:
+    """
+    Extract text from the pdf file, reusing the cached result if the same file was already processed
+    with the same extraction strategy.
+    :param pdf_path: Path of the pdf file.
+    :param pdf_hash: Hash of the file contents (computed if not given).
+    :return: Extracted text.
+    """
+    if pdf_hash is None:
+        pdf_hash = get_file_hash(pdf_path)
+    key = f"{pdf_hash}-{get_extraction_method()}-raw"
+    extracted_text = load_cached_text(key)
+    if extracted_text is None:
+        extracted_text = get_pdf_text(pdf_path)
+        store_cached_text(key, extracted_text)
+    return extracted_text
+
+def get_cleaned_text_key(pdf_hash: str)->str:
+    """
+    Get the cache key of the cleaned text of a pdf file (with the configured extraction strategy and cleanup prompt).
+    :param pdf_hash: Hash of the file contents.
+    :return: Cache key.
+    """
+    return f"{pdf_hash}-{get_extraction_method()}-{get_cleanup_prompt_version()}-cleaned"
+
+def is_cleaned_text_cached(pdf_hash: str)->bool:
+    """
+    Check whether the cleaned text of a pdf file is cached, so that its text doesn't need to be extracted.
+    :param pdf_hash: Hash of the file contents.
+    :return: True if the cleaned text is cached.
+    """
+    return os.path.exists(os.path.join(get_text_cache_dir(), f"{get_cleaned_text_key(pdf_hash)}.txt"))
+
+def get_cleaned_text(pdf_path: str, llm: Optional["BaseChatModel"] = None, pdf_hash: Optional[str] = None)->str:
+    """
+    Extract text from the pdf file and clean it of OCR / PDF text extraction artifacts, reusing the cached result
+    if the same file was already processed with the same extraction strategy and cleanup prompt.
+    :param pdf_path: Path of the pdf file.
+    :param llm: LLM to use for cleanup (a new one is created if not given).
+    :param pdf_hash: Hash of the file contents (computed if not given).
+    :return: Cleaned text.
+    """
+    if pdf_hash is None:
+        pdf_hash = get_file_hash(pdf_path)
+    key = get_cleaned_text_key(pdf_hash)
+    cleaned_text = load_cached_text(key)
+    if cleaned_text is None:
+        extracted_text = get_extracted_text(pdf_path, pdf_hash)
+        cleaned_text = cleanup_article(extracted_text, llm)
+        store_cached_text(key, cleaned_text)
+    return cleaned_text
\ No newline at end of file
@@ -1,7 +1,19 @@
-from typing import Sequence
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, Optional, TYPE_CHECKING
+
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
-from model import get_llm
+from model import get_llm, estimate_tokens
+from parse_config import get_map_reduce_threshold_tokens, get_map_reduce_chunk_tokens, get_map_reduce_workers, \
+    get_selective_cleanup, get_min_page_quality
+from instrumentation import timed_stage
+from text_quality import is_clean_text
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
 
 class CleanedParagraph(BaseModel):
     cleaned_text: str = Field(description="Paragraph cleaned of OCR and PDF text extraction artifacts.")
@@ -15,22 +27,187 @@ cleanup_prompt_template = PromptTemplate.from_template("The following is the tex
                                                        "Return the same article as a sequence of cleaned paragraphs - "
                                                        "with added missing spaces between words and typos. "
                                                        "Remove any sections of text that are not intelligible English due to artifacts, "
-                                                       "or that contain incorrectly parsed pseudocode or formulas."
+                                                       "or that contain incorrectly parsed pseudocode or formulas. "
+                                                       "Keep section markers (like <<<SECTION 1>>>) unchanged, "
+                                                       "each as a separate paragraph."
                                                        "\n\n {article}")
-def cleanup_article(article_text: str) -> str:
+
+# Marks the start of each section when several non-adjacent sections of an article are cleaned in a single prompt
+SECTION_MARKER = "<<<SECTION {}>>>"
+SECTION_MARKER_PATTERN = re.compile(r"<<<SECTION (\d+)>>>")
+
+# Page breaks (form feeds are output by Tesseract at the end of each page), paragraphs, lines, words
+SPLIT_SEPARATORS = ("\f", "\n\n", "\n", " ")
+
+def get_cleanup_prompt_version()->str:
     """
-    Clean the article text from OCR / PDF text extraction artifacts and return cleaned text.
-    :param article_text: Text to clean
+    Get a version identifier of the cleanup step, which changes whenever the prompt, the output schema
+    or the settings deciding which pages are cleaned are edited.
+    :return: Short hash of the cleanup prompt, output schema and page selection settings.
+    """
+    prompt_definition = (cleanup_prompt_template.template
+                         + json.dumps(CleanedDocument.model_json_schema(), sort_keys=True)
+                         + f"{get_selective_cleanup()}-{get_min_page_quality()}")
+    return hashlib.sha256(prompt_definition.encode("utf-8")).hexdigest()[:12]
+
+def split_text(text: str, max_tokens: int, separators: Sequence[str] = SPLIT_SEPARATORS)->list[str]:
+    """
+    Split the text into chunks of at most max_tokens (estimated) tokens.
+    The text is split at page boundaries where possible, then at paragraphs, lines, and finally words.
+    :param text: Text to split.
+    :param max_tokens: Maximum estimated number of tokens in a chunk.
+    :param separators: Separators to split at, in order of preference.
+    :return: List of chunks.
+    """
+    if estimate_tokens(text) <= max_tokens or not separators:
+        return [text]
+    separator, *remaining_separators = separators
+    max_length = max_tokens * 4
+    chunks = []
+    current_parts = []
+    current_length = 0
+    for part in text.split(separator):
+        if current_parts and current_length + len(separator) + len(part) > max_length:
+            chunks.append(separator.join(current_parts))
+            current_parts = []
+            current_length = 0
+        if len(part) > max_length:
+            chunks.extend(split_text(part, max_tokens, remaining_separators))
+            continue
+        current_length += len(part) + (len(separator) if current_parts else 0)
+        current_parts.append(part)
+    if current_parts:
+        chunks.append(separator.join(current_parts))
+    return chunks
+
+def is_long_text(text: str)->bool:
+    """
+    Check whether the text is long enough to be processed with map-reduce instead of a single LLM call.
+    :param text: Text to check.
+    :return: True if the text is above the configured `map_reduce_threshold_tokens`.
+    """
+    return estimate_tokens(text) > get_map_reduce_threshold_tokens()
+
+def cleanup_text(text: str, llm: "BaseChatModel")->str:
+    """
+    Clean the text from OCR / PDF text extraction artifacts with a single LLM call.
+    :param text: Text to clean
+    :param llm: LLM to use
     :return: Cleaned text
     """
-    llm = get_llm()
-    prompt = cleanup_prompt_template.format(article=article_text)
+    prompt = cleanup_prompt_template.format(article=text)
     structured_llm_json = llm.with_structured_output(CleanedDocument, method="json_schema")
-    result = structured_llm_json.invoke(
-        prompt
-    )
+    with timed_stage("cleanup llm") as stats:
+        stats.bytes_processed = len(text.encode("utf-8"))
+        result = structured_llm_json.invoke(
+            prompt
+        )
     cleaned_paragraphs = result.cleaned_paragraphs
-    cleaned_text = ""
-    for paragraph in cleaned_paragraphs:
-        cleaned_text += paragraph.cleaned_text+"\n"
-    return cleaned_text
\ No newline at end of file
+    return "".join(paragraph.cleaned_text+"\n" for paragraph in cleaned_paragraphs)
+
+def cleanup_sections(sections: Sequence[str], llm: "BaseChatModel")->list[str]:
+    """
+    Clean several sections of an article with a single LLM call. Each section is preceded by a marker,
+    so that the cleaned text can be split back into the sections.
+    If the markers don't come back in order, the whole cleaned text is returned as the first section.
+    :param sections: Texts of the sections to clean.
+    :param llm: LLM to use.
+    :return: Cleaned texts of the sections.
+    """
+    if len(sections) == 1:
+        return [cleanup_text(sections[0], llm)]
+    marked_text = "\n\n".join(f"{SECTION_MARKER.format(number)}\n\n{section}" for number, section in enumerate(sections))
+    cleaned_text = cleanup_text(marked_text, llm)
+    # Alternating text and section numbers, starting with the (normally empty) text before the first marker
+    parts = SECTION_MARKER_PATTERN.split(cleaned_text)
+    if [int(x) for x in parts[1::2]] != list(range(len(sections))):
+        return [cleaned_text] + [""] * (len(sections) - 1)
+    cleaned_sections = [x.lstrip("\n") for x in parts[2::2]]
+    cleaned_sections[0] = parts[0].lstrip("\n") + cleaned_sections[0]
+    return cleaned_sections
+
+def pack_sections(sections: Sequence[str], max_tokens: int)->list[list[int]]:
+    """
+    Group consecutive sections into as few prompts as possible, each with at most max_tokens (estimated) tokens.
+    A section larger than max_tokens gets a prompt of its own.
+    :param sections: Texts of the sections.
+    :param max_tokens: Maximum estimated number of tokens of the sections in a prompt.
+    :return: Lists of the indices of the sections in each prompt, in order.
+    """
+    groups = []
+    group_tokens = 0
+    for index, section in enumerate(sections):
+        section_tokens = estimate_tokens(SECTION_MARKER.format(index) + "\n\n" + section)
+        if groups and group_tokens + section_tokens <= max_tokens:
+            groups[-1].append(index)
+            group_tokens += section_tokens
+        else:
+            groups.append([index])
+            group_tokens = section_tokens
+    return groups
+
+def get_cleanup_sections(article_text: str)->list[tuple[str, bool]]:
+    """
+    Split the article into sections of consecutive pages that either need LLM cleanup or are already clean
+    (based on the local text quality score of each page).
+    :param article_text: Text of the article, with pages separated by form feeds.
+    :return: List of (section text, whether it needs cleanup) tuples, in order.
+    """
+    if not get_selective_cleanup():
+        return [(article_text, True)]
+    sections = []
+    for page in article_text.split("\f"):
+        # Empty pages have nothing to clean
+        needs_cleanup = bool(page.strip()) and not is_clean_text(page)
+        if sections and sections[-1][1] == needs_cleanup:
+            sections[-1][0].append(page)
+        else:
+            sections.append(([page], needs_cleanup))
+    return [("\f".join(pages), needs_cleanup) for pages, needs_cleanup in sections]
+
+def cleanup_article(article_text: str, llm: Optional["BaseChatModel"] = None) -> str:
+    """
+    Clean the article text from OCR / PDF text extraction artifacts and return cleaned text.
+    Pages which already have good quality text are kept as they are, and only the remaining ones are sent to the LLM,
+    with all the sections of bad pages packed into as few prompts as possible (a single one unless they're long).
+    If the text to clean is long, prompts are limited to `map_reduce_chunk_tokens`, since the whole text has to be
+    returned by the LLM, and only sections larger than that are split. All the LLM calls are made concurrently.
+    :param article_text: Text to clean (with pages separated by form feeds)
+    :param llm: LLM to use (a new one is created if not given)
+    :return: Cleaned text
+    """
+    if llm is None:
+        llm = get_llm()
+
+    sections = get_cleanup_sections(article_text)
+    sections_to_clean = [section_text for section_text, needs_cleanup in sections if needs_cleanup]
+    if is_long_text("\f".join(sections_to_clean)):
+        max_tokens = get_map_reduce_chunk_tokens()
+    else:
+        max_tokens = get_map_reduce_threshold_tokens()
+
+    # Clean sections are kept as strings, sections needing cleanup are replaced by their number of chunks
+    parts = []
+    chunks_to_clean = []
+    for section_text, needs_cleanup in sections:
+        if not needs_cleanup:
+            parts.append(section_text.replace("\f", "\n") + "\n")
+            continue
+        chunks = split_text(section_text, max_tokens)
+        parts.append(len(chunks))
+        chunks_to_clean.extend(chunks)
+
+    groups = pack_sections(chunks_to_clean, max_tokens)
+    with ThreadPoolExecutor(max_workers=get_map_reduce_workers()) as executor:
+        cleaned_groups = list(executor.map(
+            lambda group: cleanup_sections([chunks_to_clean[i] for i in group], llm), groups
+        ))
+    cleaned_chunks = iter([chunk for cleaned_group in cleaned_groups for chunk in cleaned_group])
+
+    cleaned_text = []
+    for part in parts:
+        if isinstance(part, str):
+            cleaned_text.append(part)
+        else:
+            cleaned_text.extend(next(cleaned_chunks) for _ in range(part))
+    return "".join(cleaned_text)
\ No newline at end of file
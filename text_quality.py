@@ -0,0 +1,51 @@
+import re
+
+from parse_config import get_min_page_quality
+
+WORD_PATTERN = re.compile(r"[A-Za-z]+")
+# Characters that are common in clean text and shouldn't count as symbol noise
+PLAIN_CHARACTERS = frozenset(".,;:'\"()-%/")
+# Words longer than this are very rare in English, and usually a sign of missing spaces
+GLUED_WORD_LENGTH = 18
+# Most frequent English words (and words frequent in scientific writing).
+# In clean text about half of all words come from this list, so it works as a compact dictionary check.
+COMMON_WORDS = frozenset("""
+a about above after again against all also although among an and any are as at be because been before being below
+between both but by can could did do does doing down during each either et even few for from further had has have
+having he her here hers him his how however i if in into is it its itself just less may might more most much must
+my no nor not now of off on once one only or other our out over own per same she should since so some such than that
+the their them then there these they this those through thus to too two under until up upon very via was we were
+what when where whether which while who whom why will with within without would yet you your
+al approach analysis based best case data different effect error example first figure function given high large
+learning level method methods model models network number order paper problem proposed result results section set
+show shown state system table task test three time training use used using value values well work
+""".split())
+
+
+def score_text_quality(text: str)->float:
+    """
+    Estimate how clean extracted text is, using cheap local heuristics:
+    the share of common dictionary words, the share of glued words (missing spaces) and the density of stray symbols.
+    :param text: Text to score (e.g. a single page).
+    :return: Score between 0 (garbage) and 1 (clean text).
+    """
+    words = WORD_PATTERN.findall(text)
+    if not words:
+        return 0.0
+    dictionary_ratio = sum(1 for word in words if word.lower() in COMMON_WORDS) / len(words)
+    glued_ratio = sum(1 for word in words if len(word) >= GLUED_WORD_LENGTH) / len(words)
+    symbols = sum(1 for c in text if not c.isalnum() and not c.isspace() and c not in PLAIN_CHARACTERS)
+    symbol_density = symbols / len(text)
+
+    dictionary_score = min(dictionary_ratio / 0.35, 1.0)
+    glued_penalty = min(glued_ratio * 10, 1.0)
+    symbol_penalty = min(symbol_density * 5, 1.0)
+    return dictionary_score * (1 - glued_penalty) * (1 - symbol_penalty)
+
+def is_clean_text(text: str)->bool:
+    """
+    Check whether the text is clean enough to be used without LLM cleanup.
+    :param text: Text to check (e.g. a single page).
+    :return: True if the quality score is at least `min_page_quality` from the ini file.
+    """
+    return score_text_quality(text) >= get_min_page_quality()
\ No newline at end of file